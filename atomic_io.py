@@ -0,0 +1,119 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+# Held by every process while it appends weighings, so rows and columns in the
+# index are handed out in the same order the weighings reach the journal
+WRITE_LOCK_PATH = 'data/.write.lock'
+LOCK_RETRY_DELAY = 0.05
+
+
+def fsync_directory(directory):
+    # Makes a rename durable; not possible (nor needed) on Windows
+    if os.name != 'posix':
+        return
+    fd = os.open(directory or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_write(path, mode='wb', **kwargs):
+    # Writes to a temporary file next to `path` and renames it over `path` once
+    # complete, so readers see either the old file or the new one, never a
+    # partial one. If the block raises, the old file is left untouched.
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    fsync_directory(directory)
+
+
+class WriteLock:
+    # Exclusive lock shared by threads and processes. Re-entrant within a
+    # process: only the outermost acquire touches the lock file.
+    def __init__(self, path=WRITE_LOCK_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def acquire(self):
+        self._lock.acquire()
+        try:
+            if self._depth == 0:
+                self._lock_file()
+        except BaseException:
+            self._lock.release()
+            raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            self._unlock_file()
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+    def _lock_file(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        f = open(self.path, 'a+b')
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                while True:
+                    try:
+                        f.seek(0)
+                        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError:
+                        time.sleep(LOCK_RETRY_DELAY)
+            else:
+                import fcntl
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        except BaseException:
+            f.close()
+            raise
+        self._file = f
+
+    def _unlock_file(self):
+        f, self._file = self._file, None
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        finally:
+            f.close()
+
+
+_write_lock = WriteLock()
+
+
+def write_lock():
+    return _write_lock
@@ -1,30 +1,88 @@
+import os
+import sys
+import json
 import asyncio
+import threading
 from bleak import BleakScanner
-from bleak.exc import BleakError
 from PyQt5.QtCore import QThread, pyqtSignal
-import time
-import platform
+from scale_transport import BleakTransport, ScaleLane
+
+# Lane name used when the manager drives a single scale
+DEFAULT_SCALE = 'scale-1'
+
+# Commands sent from the Qt thread to the BLE loop
+CONNECT = 'connect'
+DISCONNECT = 'disconnect'
+STOP = 'stop'
+
+# Last probe result, so later launches skip the scan once Bluetooth has worked
+PROBE_CACHE_PATH = 'data/bluetooth_probe.json'
+
+def has_adapter():
+    # Cheap check without touching the BLE stack: False when we can tell there
+    # is no adapter, None when the platform gives us no quick way to know
+    if sys.platform.startswith('linux'):
+        path = '/sys/class/bluetooth'
+        return os.path.isdir(path) and bool(os.listdir(path))
+    return None
+
+def load_probe_cache():
+    try:
+        with open(PROBE_CACHE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f).get('available')
+    except (OSError, ValueError):
+        return None
+
+def save_probe_cache(available):
+    try:
+        os.makedirs(os.path.dirname(PROBE_CACHE_PATH), exist_ok=True)
+        with open(PROBE_CACHE_PATH, 'w', encoding='utf-8') as f:
+            json.dump({'available': available}, f)
+    except OSError as e:
+        print(f"Could not save Bluetooth probe result: {e}")
 
 class BluetoothManager(QThread):
     connection_status = pyqtSignal(bool)
     error_message = pyqtSignal(str)
+    weight_received = pyqtSignal(float)
+    # Per-scale variants for multi-lane setups
+    reading_received = pyqtSignal(str, float)
+    lane_status = pyqtSignal(str, bool)
     
-    def __init__(self):
+    def __init__(self, transport=None, scales=None):
         super().__init__()
-        self.is_running = True
         self.is_connected = False
         self.loop = None
-        self.bluetooth_available = self.check_bluetooth_support()
+        self.commands = None
+        self.lane_tasks = {}
+        self.connected_scales = set()
+        self._pending_commands = [(CONNECT, None)]
+        self._commands_lock = threading.Lock()
+        # Probed on the manager's own thread once run() starts, never in __init__
+        self.bluetooth_available = None
+        # scales maps scale_id -> transport; None means a real BLE scale.
+        # Injected transports (e.g. FakeScaleTransport) need no adapter.
+        if scales is None:
+            scales = {DEFAULT_SCALE: transport}
+        self.needs_probe = any(t is None for t in scales.values())
+        self.lanes = {
+            scale_id: ScaleLane(scale_id, t if t is not None else BleakTransport(),
+                                self.on_reading, self.on_lane_status, self.on_lane_error)
+            for scale_id, t in scales.items()
+        }
 
-    def check_bluetooth_support(self):
+    async def check_bluetooth_support(self):
+        if not self.needs_probe:
+            return True
+        if has_adapter() is False:
+            self.error_message.emit("Bluetooth adapter not found. Please ensure your device supports Bluetooth and it is enabled.")
+            return False
+        if load_probe_cache():
+            return True
         try:
-            # Create a temporary event loop to check Bluetooth
-            temp_loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(temp_loop)
-            
             # Try to create a scanner
-            temp_loop.run_until_complete(BleakScanner.discover(timeout=1))
-            temp_loop.close()
+            await BleakScanner.discover(timeout=1)
+            save_probe_cache(True)
             return True
         except Exception as e:
             error_msg = str(e).lower()
@@ -32,48 +90,96 @@ class BluetoothManager(QThread):
                 self.error_message.emit("Bluetooth adapter not found. Please ensure your device supports Bluetooth and it is enabled.")
             else:
                 self.error_message.emit(f"Bluetooth error: {str(e)}")
+            save_probe_cache(False)
             return False
 
-    async def scan_devices(self):
-        if not self.bluetooth_available:
-            if self.is_connected:
-                self.is_connected = False
-                self.connection_status.emit(False)
-            time.sleep(5)  # Wait longer between checks when Bluetooth is not available
-            return
+    def on_reading(self, scale_id, weight):
+        self.reading_received.emit(scale_id, weight)
+        self.weight_received.emit(weight)
 
-        try:
-            devices = await BleakScanner.discover()
-            if devices:
-                if not self.is_connected:
-                    self.is_connected = True
-                    self.connection_status.emit(True)
-            else:
-                if self.is_connected:
-                    self.is_connected = False
-                    self.connection_status.emit(False)
-        except Exception as e:
-            print(f"Bluetooth scan error: {e}")
-            if self.is_connected:
-                self.is_connected = False
-                self.connection_status.emit(False)
-            self.error_message.emit(f"Bluetooth scan error: {str(e)}")
+    def on_lane_status(self, scale_id, connected):
+        if connected:
+            self.connected_scales.add(scale_id)
+        else:
+            self.connected_scales.discard(scale_id)
+        self.lane_status.emit(scale_id, connected)
+        is_connected = bool(self.connected_scales)
+        if self.is_connected != is_connected:
+            self.is_connected = is_connected
+            self.connection_status.emit(is_connected)
 
-    def run(self):
-        if not self.bluetooth_available:
-            self.error_message.emit("Bluetooth is not available on this device")
-            self.connection_status.emit(False)
-            return
+    def on_lane_error(self, scale_id, error):
+        print(f"Bluetooth connection error on {scale_id}: {error}")
+        self.error_message.emit(f"Bluetooth connection error: {str(error)}")
+
+    def start_lane(self, scale_id):
+        task = self.lane_tasks.get(scale_id)
+        if task is None or task.done():
+            self.lane_tasks[scale_id] = asyncio.ensure_future(self.lanes[scale_id].run())
+
+    async def cancel_lane(self, scale_id):
+        task = self.lane_tasks.pop(scale_id, None)
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def dispatch(self):
+        # The loop's only long-lived coroutine: it sleeps on the command queue
+        # and starts or cancels the lane tasks it is asked to. A scale_id of
+        # None applies the command to every lane.
+        while True:
+            command, scale_id = await self.commands.get()
+            scale_ids = list(self.lanes) if scale_id is None else [scale_id]
+            if command == CONNECT:
+                for scale_id in scale_ids:
+                    self.start_lane(scale_id)
+            elif command == DISCONNECT:
+                await asyncio.gather(*(self.cancel_lane(s) for s in scale_ids))
+            elif command == STOP:
+                await asyncio.gather(*(self.cancel_lane(s) for s in list(self.lane_tasks)))
+                return
 
+    def send_command(self, command, scale_id=None):
+        # Safe to call from any thread, before or after the loop has started
+        with self._commands_lock:
+            if self.commands is None:
+                self._pending_commands.append((command, scale_id))
+                return
+            loop = self.loop
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(self.commands.put_nowait, (command, scale_id))
+
+    def connect_scale(self, scale_id=None):
+        self.send_command(CONNECT, scale_id)
+
+    def disconnect_scale(self, scale_id=None):
+        self.send_command(DISCONNECT, scale_id)
+
+    def run(self):
         self.loop = asyncio.new_event_loop()
         asyncio.set_event_loop(self.loop)
-        
-        while self.is_running:
-            self.loop.run_until_complete(self.scan_devices())
-            time.sleep(2)
+        with self._commands_lock:
+            self.commands = asyncio.Queue()
+            for command in self._pending_commands:
+                self.commands.put_nowait(command)
+            self._pending_commands = []
+        try:
+            self.bluetooth_available = self.loop.run_until_complete(self.check_bluetooth_support())
+            if not self.bluetooth_available:
+                self.error_message.emit("Bluetooth is not available on this device")
+                self.connection_status.emit(False)
+                return
+            self.loop.run_until_complete(self.dispatch())
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+        finally:
+            with self._commands_lock:
+                self.commands = None
+                self.loop.close()
 
     def stop(self):
-        self.is_running = False
-        if self.loop:
-            self.loop.close()
-        self.wait()
\ No newline at end of file
+        # Cancels whatever the loop is doing (scan, connection, back-off) right away
+        self.send_command(STOP)
+        self.wait()
@@ -1,48 +1,254 @@
 import os
-from openpyxl import Workbook, load_workbook
+import time
+import threading
 from datetime import datetime
+from weight_journal import get_journal
+from weight_index import get_index
+from atomic_io import atomic_write, write_lock
+from workbook_reader import load_sheet, sheet_records
 
 FILE_PATH = 'data/weights.xlsx'
 
+# A weighing session group-commits after this many weighings or once the
+# oldest uncommitted one is this many seconds old
+SESSION_COMMIT_EVERY = 50
+SESSION_COMMIT_INTERVAL = 5.0
+
+# Callbacks run after every logged weighing: callback(cow_id, weight_kg, timestamp)
+_listeners = []
+
+def add_listener(callback):
+    _listeners.append(callback)
+
+def remove_listener(callback):
+    if callback in _listeners:
+        _listeners.remove(callback)
+
 def initialize_excel():
     if not os.path.exists(FILE_PATH):
+        from openpyxl import Workbook
         wb = Workbook()
         ws = wb.active
         ws.title = "weights"
         ws.cell(row=1, column=1, value='cow_id')
         wb.save(FILE_PATH)
 
-def log_weight(cow_id: str, weight_kg: float):
-    initialize_excel()
-    wb = load_workbook(FILE_PATH)
+def import_excel(journal):
+    # One-time migration: copy every weighing from the legacy workbook into the journal
+    cow_ids, timestamps, weights = load_sheet(FILE_PATH)
+    records = sheet_records(cow_ids, timestamps, weights)
+    # The index keeps the workbook's row and column order, so the first export
+    # rewrites weights.xlsx in the layout the user already has
+    get_index().rebuild(records, cow_ids=cow_ids,
+                        timestamps=[ts for ts in timestamps if ts is not None])
+    journal.append_many([(timestamp, cow_id, weight_kg, None)
+                         for timestamp, cow_id, weight_kg in records])
+    journal.sync()
+
+def open_journal():
+    journal = get_journal()
+    if not journal.exists() and os.path.exists(FILE_PATH):
+        with write_lock():
+            # Another process may have imported it while we waited
+            if not journal.exists():
+                import_excel(journal)
+    return journal
+
+def open_index():
+    # The index is derived from the journal and rebuilt if it goes missing
+    journal = open_journal()
+    index = get_index()
+    if not index.exists():
+        with write_lock():
+            if not index.exists():
+                index.rebuild(journal.records())
+    return index
+
+def export_excel():
+    # Rebuild the wide workbook (one row per cow, one column per timestamp) from the journal
+    index = open_index()
+    journal = open_journal()
+    journal.sync()
+
+    records = list(journal.records())
+    missing = [(cow_id, timestamp) for timestamp, cow_id, _ in records
+               if cow_id not in index.rows or timestamp not in index.columns]
+    if missing:
+        # Same lock as log_weights, so every process numbers rows and columns alike
+        with write_lock():
+            index.add_many(missing)
+    cells = {}
+    for timestamp, cow_id, weight_kg in records:
+        cells[(index.rows[cow_id], index.columns[timestamp])] = weight_kg
+
+    from openpyxl import Workbook
+    wb = Workbook()
     ws = wb.active
+    ws.title = "weights"
+    ws.cell(row=1, column=1, value='cow_id')
+    for timestamp, col in index.columns.items():
+        ws.cell(row=1, column=col, value=timestamp)
+    for cow_id, row in index.rows.items():
+        ws.cell(row=row, column=1, value=cow_id)
+    for (row, col), weight_kg in cells.items():
+        ws.cell(row=row, column=col, value=weight_kg)
+
+    # Readers (weight_lookup, other processes) always see a complete workbook
+    with atomic_write(FILE_PATH) as f:
+        wb.save(f)
+
+def sync_excel():
+    # Re-export only when the journal has changed since the last export
+    journal = open_journal()
+    if not journal.exists():
+        initialize_excel()
+        return
+    journal.sync()
+    if (not os.path.exists(FILE_PATH)
+            or journal.mtime() > os.stat(FILE_PATH).st_mtime_ns):
+        export_excel()
+
+def now_timestamp():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-    # Check if timestamp already exists in header
-    headers = [ws.cell(row=1, column=col).value for col in range(1, ws.max_column + 1)]
-    if timestamp not in headers:
-        ws.cell(row=1, column=ws.max_column + 1, value=timestamp)
-        timestamp_col = ws.max_column
-    else:
-        timestamp_col = headers.index(timestamp) + 1
-
-    # Check if cow_id already exists
-    cow_row = None
-    for row in range(2, ws.max_row + 1):
-        if str(ws.cell(row=row, column=1).value) == str(cow_id):
-            cow_row = row
-            break
-
-    if cow_row is None:
-        cow_row = ws.max_row + 1
-        ws.cell(row=cow_row, column=1, value=cow_id)
-
-    # Write weight
-    ws.cell(row=cow_row, column=timestamp_col, value=weight_kg)
-    wb.save(FILE_PATH)
+def log_weights(weighings, sync=False):
+    # weighings: (cow_id, weight_kg, timestamp, scale_id) tuples, written as one
+    # journal append; sync=True makes the batch durable with a single fsync
+    weighings = [(str(cow_id), float(weight_kg), timestamp, scale_id)
+                 for cow_id, weight_kg, timestamp, scale_id in weighings]
+    if not weighings:
+        return
+    index = open_index()
+    journal = open_journal()
+    # Writers in other processes wait here; readers never do
+    with write_lock():
+        # Index first: a crash in between leaves an empty cell, never an unindexed weighing
+        index.add_many([(cow_id, timestamp) for cow_id, _, timestamp, _ in weighings])
+        journal.append_many([(timestamp, cow_id, weight_kg, scale_id)
+                             for cow_id, weight_kg, timestamp, scale_id in weighings])
+        if sync:
+            journal.sync()
+    for cow_id, weight_kg, timestamp, _ in weighings:
+        for callback in list(_listeners):
+            # The weighing is already saved; a failing listener must not undo that
+            try:
+                callback(cow_id, weight_kg, timestamp)
+            except Exception as e:
+                print(f"Error notifying weighing listener: {e}")
+
+def log_weight(cow_id: str, weight_kg: float, scale_id=None):
+    timestamp = now_timestamp()
+    log_weights([(cow_id, weight_kg, timestamp, scale_id)])
     print(f"Logged {weight_kg}kg for cow {cow_id} at {timestamp}")
 
+class WeighingSession:
+    # Write-ahead weighing session: each weighing is appended to the journal
+    # as soon as it is logged (flushed to the OS, so it survives a crash of
+    # this process) and the session only groups the fsyncs, one per
+    # commit_every weighings or commit_interval seconds. A power loss can
+    # cost at most the unsynced group. Weighings whose write fails stay in
+    # `pending` and are retried after commit_interval; on_error(message)
+    # hears about failures (print by default).
+    # The workbook is exported once, when the session closes.
+    def __init__(self, commit_every=SESSION_COMMIT_EVERY,
+                 commit_interval=SESSION_COMMIT_INTERVAL, export_on_close=True,
+                 on_error=None):
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.export_on_close = export_on_close
+        self.on_error = on_error
+        self.pending = []
+        self.unsynced = 0
+        self.committed = 0
+        self._lock = threading.RLock()
+        self._timer = None
+        self._first_unsynced = None
+
+    def log(self, cow_id, weight_kg, scale_id=None, timestamp=None):
+        self.log_many([(cow_id, weight_kg, scale_id, timestamp)])
+
+    def log_many(self, weighings):
+        # weighings: (cow_id, weight_kg, scale_id, timestamp or None) tuples,
+        # written with one journal append. Raises if the write or a due fsync
+        # failed; nothing is dropped, the retry picks it up.
+        with self._lock:
+            self.pending.extend((cow_id, weight_kg, timestamp or now_timestamp(), scale_id)
+                                for cow_id, weight_kg, scale_id, timestamp in weighings)
+            self._write()
+            if (self.unsynced >= self.commit_every
+                    or time.monotonic() - self._first_unsynced >= self.commit_interval):
+                self.commit()
+
+    def _write(self):
+        batch = list(self.pending)
+        if not batch:
+            return
+        try:
+            log_weights(batch)
+        except Exception:
+            self._schedule()
+            raise
+        del self.pending[:len(batch)]
+        self.unsynced += len(batch)
+        if self._first_unsynced is None:
+            self._first_unsynced = time.monotonic()
+            # Syncs a quiet tail without waiting for the next weighing
+            self._schedule()
+
+    def _schedule(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.commit_interval, self._commit_in_background)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _commit_in_background(self):
+        try:
+            self.commit()
+        except Exception as e:
+            self.report_error(e)
+
+    def report_error(self, error):
+        count = len(self.pending) + self.unsynced
+        message = f"Erro ao salvar {count} pesagens (nova tentativa em {self.commit_interval:g}s): {error}"
+        if self.on_error is not None:
+            self.on_error(message)
+        else:
+            print(message)
+
+    def commit(self):
+        # Writes whatever is still pending and fsyncs the group; returns how
+        # many weighings became durable
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._write()
+            count = self.unsynced
+            if count:
+                try:
+                    open_journal().sync()
+                except Exception:
+                    self._schedule()
+                    raise
+            self.unsynced = 0
+            self._first_unsynced = None
+            self.committed += count
+            return count
+
+    def close(self):
+        self.commit()
+        if self.export_on_close and self.committed:
+            sync_excel()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Weighings taken before an error are still real; keep them
+        self.close()
+        return False
+
 # Example usage:
 if __name__ == "__main__":
     log_weight("002", 555)
@@ -1,69 +1,162 @@
+import io
 import os
-from openpyxl import load_workbook
-from datetime import datetime
-import matplotlib.pyplot as plt
+import hashlib
+import multiprocessing
+import sys
+import time
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 from reportlab.lib.utils import ImageReader
+from weight_store import get_store
+from atomic_io import atomic_write
 
-FILE_PATH = 'data/weights.xlsx'
 OUTPUT_PDF = 'report.pdf'
 TEMP_DIR = 'temp_charts'
 
+# Chart rendering runs in a process pool; None uses one process per core
+WORKERS = None
+
+# Charts go from the renderer to the PDF as in-memory PNGs; set to False
+# to write them to TEMP_DIR and read them back as before
+IN_MEMORY_CHARTS = True
+
+# In-memory charts are cached by a hash of the cow's weight series, so a
+# rebuild only renders cows weighed since the last report. Bump
+# CHART_VERSION whenever chart_png changes its output.
+CACHE_DIR = 'data/report_cache'
+CHART_VERSION = 1
+
 def load_data():
-    wb = load_workbook(FILE_PATH)
-    ws = wb.active
-    headers = [ws.cell(row=1, column=col).value for col in range(2, ws.max_column + 1)]
-    cow_data = {}
-    for row in range(2, ws.max_row + 1):
-        cow_id = str(ws.cell(row=row, column=1).value)
-        values = []
-        for col, ts in enumerate(headers, start=2):
-            value = ws.cell(row=row, column=col).value
-            if value is not None:
-                try:
-                    ts_dt = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S')
-                    values.append((ts_dt, float(value)))
-                except:
-                    continue
-        if values:
-            cow_data[cow_id] = sorted(values)
-    return cow_data
+    return get_store().series()
 
-def make_chart(cow_id, values):
-    if not os.path.exists(TEMP_DIR):
-        os.makedirs(TEMP_DIR)
-    
+def chart_png(cow_id, values):
     x = [v[0].strftime('%Y-%m-%d') for v in values]
     y = [v[1] for v in values]
     
-    plt.figure(figsize=(6, 4))
-    plt.bar(x, y, color='green')
-    plt.title(f'Peso do Animal {cow_id}')
-    plt.xlabel('Data')
-    plt.ylabel('Peso (kg)')
-    plt.xticks(rotation=45)
-    plt.tight_layout()
+    # Figure API instead of pyplot: no global state, safe to run in workers
+    fig = Figure(figsize=(6, 4))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.bar(x, y, color='green')
+    ax.set_title(f'Peso do Animal {cow_id}')
+    ax.set_xlabel('Data')
+    ax.set_ylabel('Peso (kg)')
+    ax.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
     
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+def make_chart(cow_id, values):
+    if not os.path.exists(TEMP_DIR):
+        os.makedirs(TEMP_DIR, exist_ok=True)
     path = os.path.join(TEMP_DIR, f'{cow_id}.png')
-    plt.savefig(path)
-    plt.close()
+    with open(path, 'wb') as f:
+        f.write(chart_png(cow_id, values))
     return path
 
-def generate_pdf(cow_data):
-    c = canvas.Canvas(OUTPUT_PDF, pagesize=A4)
+def render_chart(item, in_memory=IN_MEMORY_CHARTS):
+    # Returns (cow_id, PNG bytes) or (cow_id, PNG path)
+    cow_id, values = item
+    if in_memory:
+        return cow_id, chart_png(cow_id, values)
+    return cow_id, make_chart(cow_id, values)
+
+def series_hash(cow_id, values):
+    digest = hashlib.sha1(f"{CHART_VERSION}|{cow_id}".encode('utf-8'))
+    for ts, weight in values:
+        digest.update(f"|{ts:%Y-%m-%d %H:%M:%S}={weight!r}".encode('utf-8'))
+    return digest.hexdigest()
+
+def cached_chart(key):
+    path = os.path.join(CACHE_DIR, f'{key}.png')
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
+
+def store_chart(key, png):
+    with atomic_write(os.path.join(CACHE_DIR, f'{key}.png')) as f:
+        f.write(png)
+
+def prune_cache(keep):
+    # Drops charts of series that are no longer in the herd
+    if not os.path.exists(CACHE_DIR):
+        return
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith('.png') and name[:-4] not in keep:
+            os.remove(os.path.join(CACHE_DIR, name))
+
+def render_pool(render, items, workers):
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(items) < 2:
+        yield from map(render, items)
+        return
+    # Small chunks keep cancellation prompt; a chart costs far more than its pickling
+    chunksize = max(1, min(8, len(items) // (workers * 4)))
+    # spawn, not fork: reports may be started from a GUI worker thread
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        yield from pool.map(render, items, chunksize=chunksize)
+    finally:
+        # A cancelled report drops the charts that have not started yet
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def render_charts(cow_data, workers=WORKERS, in_memory=IN_MEMORY_CHARTS):
+    # Yields (cow_id, chart) in the same order as cow_data
+    items = list(cow_data.items())
+    render = partial(render_chart, in_memory=in_memory)
+    if not in_memory:
+        yield from render_pool(render, items, workers)
+        return
+
+    keys = [series_hash(cow_id, values) for cow_id, values in items]
+    cached = [cached_chart(key) for key in keys]
+    missing = [item for item, png in zip(items, cached) if png is None]
+    rendered = render_pool(render, missing, workers)
+    try:
+        for (cow_id, _), key, png in zip(items, keys, cached):
+            if png is None:
+                _, png = next(rendered)
+                store_chart(key, png)
+            yield cow_id, png
+    finally:
+        rendered.close()
+    prune_cache(set(keys))
+    print(f"Charts reused from cache: {len(items) - len(missing)}, rendered: {len(missing)}")
+
+def generate_pdf(cow_data, workers=WORKERS, in_memory=IN_MEMORY_CHARTS, progress=None):
+    # The previous report stays readable until the new one is complete
+    with atomic_write(OUTPUT_PDF) as f:
+        write_pdf(f, cow_data, workers, in_memory, progress)
+
+def write_pdf(f, cow_data, workers, in_memory, progress):
+    c = canvas.Canvas(f, pagesize=A4)
     width, height = A4
     margin = 40
 
-    for cow_id, values in cow_data.items():
-        img_path = make_chart(cow_id, values)
-        c.setFont("Helvetica-Bold", 16)
-        c.drawString(margin, height - margin, f"Animal ID: {cow_id}")
-        
-        img = ImageReader(img_path)
-        c.drawImage(img, margin, height/2 - 100, width=width - 2*margin, preserveAspectRatio=True, mask='auto')
+    # Charts are rendered in parallel; this loop is the only writer and adds pages in order
+    total = len(cow_data)
+    charts = render_charts(cow_data, workers, in_memory)
+    try:
+        for done, (cow_id, chart) in enumerate(charts, start=1):
+            c.setFont("Helvetica-Bold", 16)
+            c.drawString(margin, height - margin, f"Animal ID: {cow_id}")
+            
+            img = ImageReader(io.BytesIO(chart) if in_memory else chart)
+            c.drawImage(img, margin, height/2 - 100, width=width - 2*margin, preserveAspectRatio=True, mask='auto')
 
-        c.showPage()
+            c.showPage()
+            # progress(done, total) may raise to cancel; the PDF is only written by save()
+            if progress is not None:
+                progress(done, total)
+    finally:
+        charts.close()
 
     c.save()
 
@@ -72,30 +165,35 @@ def cleanup():
     if os.path.exists(TEMP_DIR):
         shutil.rmtree(TEMP_DIR)
 
-def main():
-    try:
-        cow_data = load_data()
-    except FileNotFoundError:
-        print("⚠️ Arquivo Excel não encontrado.")
-        return
+def build_report(workers=WORKERS, progress=None, cow_data=None):
+    # cow_data is load_data()'s result; the GUI takes it on its own thread,
+    # since the shared WeightStore is not safe to reload from a worker
+    if cow_data is None:
+        try:
+            cow_data = load_data()
+        except FileNotFoundError:
+            print("⚠️ Arquivo Excel não encontrado.")
+            return
     if not cow_data:
         print("⚠️ Nenhum dado disponível.")
         return
 
-    generate_pdf(cow_data)
-    cleanup()
-    print(f"✅ Relatório gerado com sucesso: {OUTPUT_PDF}")
+    start = time.perf_counter()
+    generate_pdf(cow_data, workers, progress=progress)
+    if not IN_MEMORY_CHARTS:
+        cleanup()
+    elapsed = time.perf_counter() - start
+    print(f"✅ Relatório gerado com sucesso: {OUTPUT_PDF} "
+          f"({len(cow_data)} animais em {elapsed:.1f}s, {workers or os.cpu_count()} processos)")
+    return OUTPUT_PDF
 
-def generate_report_from_gui():
-    try:
-        cow_data = load_data()
-    except FileNotFoundError:
-        print("⚠️ Arquivo Excel não encontrado.")
-        return
-    if not cow_data:
-        print("⚠️ Nenhum dado disponível.")
-        return
+def main():
+    # Optional argument: number of worker processes, to compare timings against core count
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else WORKERS
+    build_report(workers)
+
+def generate_report_from_gui(cow_data, progress=None):
+    return build_report(progress=progress, cow_data=cow_data)
 
-    generate_pdf(cow_data)
-    cleanup()
-    print(f"✅ Relatório gerado com sucesso: {OUTPUT_PDF}")
+if __name__ == "__main__":
+    main()
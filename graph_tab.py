@@ -1,11 +1,15 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
                            QLabel, QLineEdit, QFrame, QComboBox)
 from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QFont, QFontDatabase
+from PyQt5.QtGui import QFont
+import startup
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-import matplotlib.pyplot as plt
-import matplotlib.font_manager as fm
-import pandas as pd
+from matplotlib.figure import Figure
+from matplotlib.ticker import MaxNLocator
+from matplotlib.collections import LineCollection
+from herd_repository import get_repository
+from weight_aggregates import get_aggregates
+from herd_plot import decimate, herd_segments, percentile_band
 import numpy as np
 from datetime import datetime, timedelta
 
@@ -15,31 +19,27 @@ class GraphTab(QWidget):
         self.main_window = main_window
         self.setStyleSheet("background-color: #6A994E;")
         
-        # Load and register Montserrat fonts
-        font_paths = {
-            'Montserrat-Black': 'fonts/Montserrat-Black.ttf',
-            'Montserrat-Bold': 'fonts/Montserrat-Bold.ttf'
-        }
-        
-        for font_name, font_path in font_paths.items():
-            # Add font for Qt
-            font_id = QFontDatabase.addApplicationFont(font_path)
-            if font_id < 0:
-                print(f"Error: Could not load {font_name} font for Qt")
-            
-            # Register font for matplotlib
-            try:
-                fm.fontManager.addfont(font_path)
-            except Exception as e:
-                print(f"Error registering {font_name} for matplotlib: {e}")
-
-        # Set Montserrat as the default font family for matplotlib
-        plt.rcParams['font.family'] = 'Montserrat'
-        
+        # Fonts are registered once per process, by whichever screen comes first
+        startup.register_qt_fonts()
+        startup.setup_matplotlib()
+
         self.initUI()
 
     def go_back(self):
-        self.main_window.initUI()
+        self.main_window.show_home()
+
+    def refresh(self):
+        # Called every time the screen is shown: the widgets are kept, only
+        # the data is brought up to date
+        if get_repository().version != self.cow_ids_version:
+            selected = self.gado_combo.currentText()
+            self.gado_combo.blockSignals(True)
+            self.gado_combo.clear()
+            self.load_cow_ids()
+            index = self.gado_combo.findText(selected)
+            self.gado_combo.setCurrentIndex(max(index, 0))
+            self.gado_combo.blockSignals(False)
+        self.update_plot()
 
     def initUI(self):
         # Main layout
@@ -114,8 +114,14 @@ class GraphTab(QWidget):
         graph_layout.setContentsMargins(20, 20, 20, 20)
 
         # Create the matplotlib figure
-        self.figure, self.ax = plt.subplots(figsize=(8, 6))
+        self.figure = Figure(figsize=(8, 6))
+        self.ax = self.figure.add_subplot()
         self.canvas = FigureCanvas(self.figure)
+        # Herd chart state: rebuilt when the repository version changes
+        self.herd_version = None
+        self.herd_background = None
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+        self.canvas.mpl_connect('motion_notify_event', self.on_hover)
         graph_layout.addWidget(self.canvas)
 
         # Add labels
@@ -193,136 +199,35 @@ class GraphTab(QWidget):
 
     def load_cow_ids(self):
         try:
-            df = pd.read_excel("data/weights.xlsx")
+            repository = get_repository()
+            self.cow_ids_version = repository.version
             self.gado_combo.addItem("Todos")
-            cow_ids = df.iloc[:, 0].unique()
-            for cow_id in cow_ids:
+            for cow_id in repository.cow_ids():
                 self.gado_combo.addItem(str(cow_id))
         except Exception as e:
             print(f"Error loading cow IDs: {e}")
 
+    def set_stat(self, field, text):
+        field.itemAt(1).widget().setText(text)
+
     def calculate_statistics(self):
         try:
-            df = pd.read_excel("data/weights.xlsx")
+            aggregates = get_aggregates()
             selected = self.gado_combo.currentText()
             
-            print(f"\nCalculating statistics for: {selected}")
-            print("DataFrame head:")
-            print(df.head())
-            
-            # Get timestamps from column headers (excluding the first column which is cow_id)
-            weight_columns = [col for col in df.columns if col != 'cow_id']
-            timestamps = pd.to_datetime(weight_columns)
-            print("\nTimestamps:", timestamps)
-            
             if selected == "Todos":
-                # Get all valid weights for each timestamp
-                all_current_weights = []  # For peso médio
-                all_gmds = []  # For GMD
-                
-                for _, row in df.iterrows():
-                    weights = row.iloc[1:].dropna()
-                    if len(weights) > 0:
-                        # Convert weights to float
-                        weights = weights.astype(float)
-                        print(f"\nProcessing cow weights: {weights.values}")
-                        # Add last weight for current average
-                        all_current_weights.append(weights.iloc[-1])
-                        
-                        if len(weights) >= 2:
-                            # Get timestamps for this cow's measurements
-                            # Get numeric positions of non-null values
-                            weight_positions = weights.index.get_indexer(weights.index)
-                            valid_timestamps = timestamps[weight_positions]
-                            print(f"Valid timestamps: {valid_timestamps}")
-                            
-                            # Calculate GMD using the formula: (f(x) - f(x')) / (x - x')
-                            days_diff = (valid_timestamps[-1] - valid_timestamps[0]).days
-                            print(f"Days difference: {days_diff}")
-                            
-                            if days_diff > 0:  # Avoid division by zero
-                                weight_diff = weights.iloc[-1] - weights.iloc[0]
-                                gmd = weight_diff / days_diff
-                                print(f"Weight diff: {weight_diff}, GMD: {gmd}")
-                                all_gmds.append(gmd)
-                
-                print(f"\nAll current weights: {all_current_weights}")
-                print(f"All GMDs: {all_gmds}")
-                
-                if all_current_weights:
-                    # Calculate current average weight
-                    current_avg = np.mean(all_current_weights)
-                    print(f"Current average weight: {current_avg:.1f}")
-                    self.peso_medio.itemAt(1).widget().setText(f"{current_avg:.1f} kg")
-                    
-                    if all_gmds:
-                        # Calculate average GMD
-                        avg_gmd = np.mean(all_gmds)
-                        print(f"Average GMD: {avg_gmd:.2f}")
-                        self.gmd.itemAt(1).widget().setText(f"{avg_gmd:.2f} kg/dia")
-                        
-                        # Calculate prediction using f(z+90) = (GMD * 90) + f(x)
-                        predicted_weight = (avg_gmd * 90) + current_avg
-                        print(f"Predicted weight: {predicted_weight:.1f}")
-                        self.previsao.itemAt(1).widget().setText(f"{predicted_weight:.1f} kg")
-                    else:
-                        print("No GMDs calculated")
-                        self.gmd.itemAt(1).widget().setText("N/A")
-                        self.previsao.itemAt(1).widget().setText("N/A")
-                else:
-                    print("No current weights found")
-                    self.peso_medio.itemAt(1).widget().setText("N/A")
-                    self.gmd.itemAt(1).widget().setText("N/A")
-                    self.previsao.itemAt(1).widget().setText("N/A")
+                peso_medio, gmd, previsao = aggregates.peso_medio(), aggregates.gmd(), aggregates.projection()
             else:
-                # Calculate for selected cow
-                row = df[df.iloc[:, 0].astype(str) == selected].iloc[0]
-                weights = row.iloc[1:].dropna()
-                
-                print(f"\nSelected cow weights: {weights}")
-                
-                if len(weights) > 0:
-                    # Convert weights to float
-                    weights = weights.astype(float)
-                    # Calculate average weight
-                    avg_weight = weights.mean()
-                    print(f"Average weight: {avg_weight:.1f}")
-                    self.peso_medio.itemAt(1).widget().setText(f"{avg_weight:.1f} kg")
-                    
-                    if len(weights) >= 2:
-                        # Get timestamps for this cow's measurements
-                        # Get numeric positions of non-null values
-                        weight_positions = weights.index.get_indexer(weights.index)
-                        valid_timestamps = timestamps[weight_positions]
-                        print(f"Valid timestamps: {valid_timestamps}")
-                        
-                        # Calculate GMD using the formula: (f(x) - f(x')) / (x - x')
-                        days_diff = (valid_timestamps[-1] - valid_timestamps[0]).days
-                        print(f"Days difference: {days_diff}")
-                        
-                        if days_diff > 0:
-                            weight_diff = weights.iloc[-1] - weights.iloc[0]
-                            gmd = weight_diff / days_diff
-                            print(f"Weight diff: {weight_diff}, GMD: {gmd:.2f}")
-                            self.gmd.itemAt(1).widget().setText(f"{gmd:.2f} kg/dia")
-                            
-                            # Calculate prediction using f(z+90) = (GMD * 90) + f(x)
-                            predicted_weight = (gmd * 90) + weights.iloc[-1]
-                            print(f"Predicted weight: {predicted_weight:.1f}")
-                            self.previsao.itemAt(1).widget().setText(f"{predicted_weight:.1f} kg")
-                        else:
-                            print("Zero days difference")
-                            self.gmd.itemAt(1).widget().setText("N/A")
-                            self.previsao.itemAt(1).widget().setText("N/A")
-                    else:
-                        print("Not enough measurements")
-                        self.gmd.itemAt(1).widget().setText("N/A")
-                        self.previsao.itemAt(1).widget().setText("N/A")
+                cow = aggregates.cow(selected)
+                if cow is None:
+                    peso_medio, gmd, previsao = None, None, None
                 else:
-                    print("No weights found")
-                    self.peso_medio.itemAt(1).widget().setText("N/A")
-                    self.gmd.itemAt(1).widget().setText("N/A")
-                    self.previsao.itemAt(1).widget().setText("N/A")
+                    peso_medio, gmd, previsao = cow.mean(), cow.gmd(), cow.projection()
+            
+            self.set_stat(self.peso_medio, f"{peso_medio:.1f} kg" if peso_medio is not None else "N/A")
+            self.set_stat(self.gmd, f"{gmd:.2f} kg/dia" if gmd is not None else "N/A")
+            # Prediction using f(z+90) = (GMD * 90) + f(x)
+            self.set_stat(self.previsao, f"{previsao:.1f} kg" if previsao is not None else "N/A")
                 
         except Exception as e:
             print(f"Error calculating statistics: {e}")
@@ -331,62 +236,118 @@ class GraphTab(QWidget):
 
     def update_plot(self):
         try:
-            self.ax.clear()
-            df = pd.read_excel("data/weights.xlsx")
-            selected = self.gado_combo.currentText()
-
-            if selected == "Todos":
-                # Plot all cows
-                for _, row in df.iterrows():
-                    cow_id = int(row.iloc[0])  # Convert to integer to remove decimal
-                    weights = row.iloc[1:].dropna().astype(float)
-                    if len(weights) > 0:
-                        x = range(1, len(weights) + 1)
-                        self.ax.plot(x, weights, marker='o', label=f'Gado {cow_id}', linewidth=2)
-                
-                # Add legend with Montserrat Bold font at bottom right
-                legend = self.ax.legend(prop={'family': 'Montserrat', 'weight': 'bold'}, 
-                                      loc='lower right',
-                                      bbox_to_anchor=(1, 0))
-                legend.get_frame().set_facecolor('#F2E8CF')
-                legend.get_frame().set_edgecolor('#386641')
-                for text in legend.get_texts():
-                    text.set_color('#386641')
-                    text.set_fontfamily('Montserrat')
+            if self.gado_combo.currentText() == "Todos":
+                self.plot_herd()
             else:
-                # Plot selected cow
-                row = df[df.iloc[:, 0].astype(str) == selected].iloc[0]
-                weights = row.iloc[1:].dropna().astype(float)
-                if len(weights) > 0:
-                    x = range(1, len(weights) + 1)
-                    self.ax.plot(x, weights, marker='o', color='#A7C957', linewidth=2)
-
-            # Configure grid
-            self.ax.grid(True, color='#386641', linestyle='-', linewidth=0.5, alpha=0.2)
-            self.ax.set_axisbelow(True)
-
-            # Set integer ticks on x-axis
-            self.ax.xaxis.set_major_locator(plt.MaxNLocator(integer=True))
-
-            # Update tick colors and font
-            self.ax.tick_params(colors='#386641')
-            for label in self.ax.get_xticklabels() + self.ax.get_yticklabels():
-                label.set_fontfamily('Montserrat Bold')
-                label.set_fontweight('bold')
-            
-            # Configure spines
-            self.ax.spines['top'].set_visible(False)
-            self.ax.spines['right'].set_visible(False)
-            self.ax.spines['bottom'].set_color('#386641')
-            self.ax.spines['left'].set_color('#386641')
-
+                self.plot_cow()
             # Update statistics
             self.calculate_statistics()
-
-            # Adjust layout to prevent legend from being cut off
-            self.figure.tight_layout()
-            self.canvas.draw()
-
         except Exception as e:
             print(f"Error updating plot: {e}")
 
+    def plot_cow(self):
+        self.ax.clear()
+        self.herd_version = None
+        self.herd_background = None
+        df = get_repository().frame()
+        selected = self.gado_combo.currentText()
+
+        # Plot selected cow
+        row = df[df.iloc[:, 0].astype(str) == selected].iloc[0]
+        weights = row.iloc[1:].dropna().astype(float)
+        if len(weights) > 0:
+            x = range(1, len(weights) + 1)
+            self.ax.plot(x, weights, marker='o', color='#A7C957', linewidth=2)
+
+        self.style_axes()
+        self.figure.tight_layout()
+        self.canvas.draw()
+
+    def plot_herd(self):
+        # The whole herd as one LineCollection (long series decimated), a
+        # P10-P90 band and the median, instead of one line and legend entry
+        # per cow. Rebuilt only when the data changed; the hovered cow is an
+        # overlay blitted over the cached background.
+        repository = get_repository()
+        if self.herd_version == repository.version:
+            return
+        self.herd_version = repository.version
+        self.herd_ids, self.herd_aligned = repository.aligned()
+
+        self.ax.clear()
+        self.herd_background = None
+        segments = herd_segments(self.herd_aligned)
+        herd = LineCollection(segments, colors='#A7C957', linewidths=1, alpha=0.5,
+                              label=f'Rebanho ({len(segments)} animais)')
+        self.ax.add_collection(herd)
+        x, (low, median, high) = percentile_band(self.herd_aligned)
+        if len(x):
+            self.ax.fill_between(x, low, high, color='#386641', alpha=0.15, linewidth=0, label='P10–P90')
+            self.ax.plot(x, median, color='#386641', linewidth=2.5, label='Mediana')
+        self.ax.autoscale_view()
+
+        self.highlight, = self.ax.plot([], [], color='#454851', linewidth=2.5, animated=True)
+        self.highlight_label = self.ax.annotate('', (0, 0), xytext=(8, 8), textcoords='offset points',
+                                                color='#386641', fontweight='bold', animated=True)
+
+        if segments:
+            legend = self.ax.legend(prop={'family': 'Montserrat', 'weight': 'bold'},
+                                    loc='lower right', bbox_to_anchor=(1, 0))
+            legend.get_frame().set_facecolor('#F2E8CF')
+            legend.get_frame().set_edgecolor('#386641')
+            for text in legend.get_texts():
+                text.set_color('#386641')
+                text.set_fontfamily('Montserrat')
+
+        self.style_axes()
+        self.figure.tight_layout()
+        self.canvas.draw()
+
+    def style_axes(self):
+        # Configure grid
+        self.ax.grid(True, color='#386641', linestyle='-', linewidth=0.5, alpha=0.2)
+        self.ax.set_axisbelow(True)
+
+        # Set integer ticks on x-axis
+        self.ax.xaxis.set_major_locator(MaxNLocator(integer=True))
+
+        # Update tick colors and font
+        self.ax.tick_params(colors='#386641')
+        for label in self.ax.get_xticklabels() + self.ax.get_yticklabels():
+            label.set_fontfamily('Montserrat Bold')
+            label.set_fontweight('bold')
+
+        # Configure spines
+        self.ax.spines['top'].set_visible(False)
+        self.ax.spines['right'].set_visible(False)
+        self.ax.spines['bottom'].set_color('#386641')
+        self.ax.spines['left'].set_color('#386641')
+
+    def on_draw(self, event):
+        # Every full draw (including resizes) refreshes the cached background
+        if self.herd_version is not None:
+            self.herd_background = self.canvas.copy_from_bbox(self.ax.bbox)
+
+    def on_hover(self, event):
+        # Highlights the cow closest to the cursor in the herd chart
+        if self.herd_background is None or event.inaxes is not self.ax:
+            return
+        position = int(round(event.xdata)) - 1
+        if not 0 <= position < self.herd_aligned.shape[1]:
+            return
+        column = self.herd_aligned[:, position]
+        if np.isnan(column).all():
+            return
+        row = int(np.nanargmin(np.abs(column - event.ydata)))
+        weights = self.herd_aligned[row]
+        weights = weights[~np.isnan(weights)]
+        x, y = decimate(weights)
+        self.highlight.set_data(x, y)
+        self.highlight_label.xy = (position + 1, column[row])
+        self.highlight_label.set_text(f'Gado {self.herd_ids[row]}')
+
+        self.canvas.restore_region(self.herd_background)
+        self.ax.draw_artist(self.highlight)
+        self.ax.draw_artist(self.highlight_label)
+        self.canvas.blit(self.ax.bbox)
+
@@ -1,16 +1,18 @@
+import startup
 import sys
+import numpy as np
+from datetime import date
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QLabel, 
-                           QWidget, QVBoxLayout, QHBoxLayout, QFrame, QGraphicsDropShadowEffect)
-from PyQt5.QtGui import QFont, QPalette, QColor, QFontDatabase, QTransform, QPainter
-from PyQt5.QtCore import Qt
-from graph_tab import GraphTab
-from simulation_tab import SimulationTab
-from generate_pdf_report import generate_report_from_gui
-from bluetooth_manager import BluetoothManager
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-import pandas as pd
-import matplotlib.font_manager as fm
+                           QWidget, QVBoxLayout, QHBoxLayout, QFrame, QGraphicsDropShadowEffect,
+                           QStackedWidget, QMessageBox, QInputDialog)
+from PyQt5.QtGui import QFont, QPalette, QColor, QTransform, QPainter
+from PyQt5.QtCore import Qt, QTimer
+from bluetooth_manager import DEFAULT_SCALE
+from job_runner import JobRunner
+from herd_repository import get_repository
+from ingest_service import IngestService, get_weighing_events
+# matplotlib, pandas, ReportLab and the other screens are imported on first
+# use, so the window is up before they load
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -20,33 +22,32 @@ class MainWindow(QMainWindow):
         self.setStyleSheet("background-color: #6A994E;")
 
         # Load and register Montserrat fonts
-        font_paths = {
-            'Montserrat-Black': 'fonts/Montserrat-Black.ttf',
-            'Montserrat-Bold': 'fonts/Montserrat-Bold.ttf'
-        }
-        
-        for font_name, font_path in font_paths.items():
-            # Add font for Qt
-            font_id = QFontDatabase.addApplicationFont(font_path)
-            if font_id < 0:
-                print(f"Error: Could not load {font_name} font for Qt")
-            
-            # Register font for matplotlib
-            try:
-                fm.fontManager.addfont(font_path)
-            except Exception as e:
-                print(f"Error registering {font_name} for matplotlib: {e}")
-
-        # Set Montserrat as the default font family for matplotlib
-        plt.rcParams['font.family'] = 'Montserrat'
-        
-        # Initialize Bluetooth manager
-        self.bluetooth_manager = BluetoothManager()
+        startup.register_qt_fonts()
+
+        # Heavy work (reports) runs off the UI thread
+        self.job_runner = JobRunner()
+        self.report_job = None
+
+        # Scale readings go through the ingest service: PESAR assigns the cow
+        # and its weight is logged once the reading settles
+        self.ingest = IngestService({DEFAULT_SCALE: None})
+        self.bluetooth_manager = self.ingest.manager
         self.bluetooth_manager.connection_status.connect(self.update_connection_status)
         self.bluetooth_manager.error_message.connect(self.show_bluetooth_error)
-        self.bluetooth_manager.start()
+        self.bluetooth_manager.weight_received.connect(self.show_weight)
+        self.ingest.recorded.connect(self.on_recorded)
+        self.ingest.write_error.connect(self.show_write_error)
+        self.last_weight = None
+        self.ingest.start()
 
         self.initUI()
+        # New weighings are drawn as they are written, not on the next full redraw
+        get_weighing_events().weighed.connect(self.on_weighing)
+        # Once the event loop runs: note how long the window took to come up,
+        # then build the home chart
+        QTimer.singleShot(0, startup.report_startup)
+        QTimer.singleShot(0, self.build_home_chart)
+        QTimer.singleShot(0, self.load_vaccines)
 
     def show_bluetooth_error(self, error_message):
         self.connection_status.setText(error_message)
@@ -59,6 +60,7 @@ class MainWindow(QMainWindow):
             }
         """)
         self.pesar_btn.setEnabled(False)
+        self.central_pesar.setEnabled(False)
 
     def update_connection_status(self, is_connected):
         if is_connected:
@@ -72,6 +74,7 @@ class MainWindow(QMainWindow):
                 }
             """)
             self.pesar_btn.setEnabled(True)
+            self.central_pesar.setEnabled(True)
         else:
             self.connection_status.setText("Por favor conecte ao aparelho")
             self.connection_status.setStyleSheet("""
@@ -83,9 +86,36 @@ class MainWindow(QMainWindow):
                 }
             """)
             self.pesar_btn.setEnabled(False)
+            self.central_pesar.setEnabled(False)
+
+    def show_weight(self, weight_kg):
+        # Live reading streamed from the scale
+        self.last_weight = weight_kg
+        cow_id = self.ingest.cows.get(DEFAULT_SCALE)
+        if cow_id is None:
+            self.connection_status.setText(f"{weight_kg:.1f} kg")
+        else:
+            self.connection_status.setText(f"Gado {cow_id}: {weight_kg:.1f} kg")
+
+    def weigh(self):
+        cow_id, ok = QInputDialog.getText(self, "PESAR", "ID do gado:")
+        cow_id = cow_id.strip()
+        if ok and cow_id:
+            self.connection_status.setText(f"Gado {cow_id}: aguardando peso estável")
+            self.ingest.set_cow(DEFAULT_SCALE, cow_id)
+
+    def on_recorded(self, scale_id, cow_id, weight_kg):
+        print(f"Logged {weight_kg}kg for cow {cow_id} on {scale_id}")
+
+    def show_write_error(self, message):
+        print(message)
+        self.connection_status.setText(message)
 
     def closeEvent(self, event):
-        self.bluetooth_manager.stop()
+        self.job_runner.cancel_all()
+        # Stops the scale and writes whatever is still queued
+        self.ingest.stop()
+        self.job_runner.wait()
         event.accept()
 
     def add_shadow(self, widget):
@@ -159,13 +189,14 @@ class MainWindow(QMainWindow):
 
     def create_vaccine_button(self, text):
         btn = QPushButton(text)
-        btn.setFont(QFont("Montserrat Bold", 14))
+        # Two lines (animal and status, then the protocol) in the same button size
+        btn.setFont(QFont("Montserrat Bold", 11))
         btn.setStyleSheet("""
             QPushButton {
                 background-color: #BC4749;
                 color: #F2E8CF;
                 border-radius: 25px;
-                padding: 10px;
+                padding: 4px 10px;
                 transition: background-color 0.3s;
                 cursor: pointer;
             }
@@ -179,21 +210,110 @@ class MainWindow(QMainWindow):
         self.add_shadow(btn)
         return btn
 
+    def load_vaccines(self):
+        from vaccination_schedule import get_schedule
+        self.schedule = get_schedule()
+        # Every weighing, from this process or another, reaches the schedule
+        # here on the GUI thread; new animals are scheduled from it
+        get_weighing_events().weighed.connect(self.on_vaccine_weighing)
+        self.update_vaccines()
+
+    def on_vaccine_weighing(self, cow_id, weight_kg, timestamp):
+        self.schedule.on_weighing(cow_id, weight_kg, timestamp)
+        self.update_vaccines()
+
+    def update_vaccines(self, *args):
+        # The soonest-due animals straight from the top of the schedule's heap,
+        # each once with its most urgent protocol
+        upcoming = self.schedule.upcoming_animals(len(self.vaccine_buttons))
+        today = date.today()
+        for btn, entry in zip(self.vaccine_buttons, upcoming + [None] * len(self.vaccine_buttons)):
+            btn.entry = entry
+            btn.setVisible(entry is not None)
+            if entry is None:
+                continue
+            cow_id, protocol, due = entry
+            days = (due - today).days
+            if days > 0:
+                status = f"{days} dias"
+            elif days == 0:
+                status = "hoje"
+            else:
+                status = "atrasada"
+            btn.setText(f"{cow_id} - {status}\n{protocol}")
+            btn.setToolTip("\n".join(f"{name}: {when.strftime('%d/%m/%Y')}"
+                                     for name, when in self.schedule.due_for(cow_id)))
+
+    def record_vaccine(self, btn):
+        if btn.entry is None:
+            return
+        cow_id, protocol, _ = btn.entry
+        answer = QMessageBox.question(self, "VACINAR", f"Registrar {protocol} para o gado {cow_id} hoje?")
+        if answer == QMessageBox.Yes:
+            self.schedule.record(cow_id, protocol)
+            self.update_vaccines()
+
+    # Each screen is built once, on first use, and kept in the stack;
+    # switching only brings its data up to date
+    def show_home(self):
+        self.update_plot()
+        self.stack.setCurrentWidget(self.home)
+
     def show_graph_tab(self):
-        self.graph_tab = GraphTab(self)
-        self.setCentralWidget(self.graph_tab)
+        if self.graph_tab is None:
+            from graph_tab import GraphTab
+            self.graph_tab = GraphTab(self)
+            self.stack.addWidget(self.graph_tab)
+        else:
+            self.graph_tab.refresh()
+        self.stack.setCurrentWidget(self.graph_tab)
 
     def show_simulation_tab(self):
-        self.simulation_tab = SimulationTab(self)
-        self.setCentralWidget(self.simulation_tab)
+        if self.simulation_tab is None:
+            from simulation_tab import SimulationTab
+            self.simulation_tab = SimulationTab(self)
+            self.stack.addWidget(self.simulation_tab)
+        else:
+            self.simulation_tab.refresh()
+        self.stack.setCurrentWidget(self.simulation_tab)
 
     def generate_pdf(self):
-        generate_report_from_gui()
+        # A second click while the report is running cancels it
+        if self.report_job is not None:
+            self.report_job.cancel()
+            return
+        from generate_pdf_report import generate_report_from_gui, load_data
+        # The herd is read here; the worker only renders this snapshot
+        try:
+            cow_data = load_data()
+        except FileNotFoundError:
+            cow_data = {}
+        self.set_report_button_text("CANCELAR")
+        self.report_job = self.job_runner.submit(generate_report_from_gui, cow_data,
+                                                 on_progress=self.on_report_progress,
+                                                 on_done=self.on_report_done)
+
+    def on_report_progress(self, done, total):
+        self.set_report_button_text(f"CANCELAR {done * 100 // total}%")
+
+    def on_report_done(self, *args):
+        self.report_job = None
+        self.set_report_button_text("GERAR PDF")
+
+    def set_report_button_text(self, text):
+        self.gerar_pdf_btn.setText(text)
 
     def initUI(self):
+        # Screens live in a stack; the home screen is the first page
+        self.stack = QStackedWidget()
+        self.setCentralWidget(self.stack)
+        self.graph_tab = None
+        self.simulation_tab = None
+
         # Main widget and layout
         central_widget = QWidget()
-        self.setCentralWidget(central_widget)
+        self.home = central_widget
+        self.stack.addWidget(central_widget)
         main_layout = QHBoxLayout(central_widget)
         main_layout.setContentsMargins(0, 0, 0, 0)
         main_layout.setSpacing(0)
@@ -218,10 +338,11 @@ class MainWindow(QMainWindow):
         # Sidebar buttons
         self.pesar_btn = self.create_sidebar_button("PESAR", True)
         self.pesar_btn.setEnabled(False)
+        self.pesar_btn.clicked.connect(self.weigh)
         ver_grafico_btn = self.create_sidebar_button("VER GRÁFICO")
         ver_grafico_btn.clicked.connect(self.show_graph_tab)
-        gerar_pdf_btn = self.create_sidebar_button("GERAR PDF")
-        gerar_pdf_btn.clicked.connect(self.generate_pdf)
+        self.gerar_pdf_btn = self.create_sidebar_button("GERAR PDF")
+        self.gerar_pdf_btn.clicked.connect(self.generate_pdf)
         simulacao_btn = self.create_sidebar_button("SIMULAÇÃO")
         simulacao_btn.clicked.connect(self.show_simulation_tab)
         catalogar_btn = self.create_sidebar_button("CATALOGAR", True)
@@ -229,7 +350,7 @@ class MainWindow(QMainWindow):
 
         sidebar.addWidget(self.pesar_btn)
         sidebar.addWidget(ver_grafico_btn)
-        sidebar.addWidget(gerar_pdf_btn)
+        sidebar.addWidget(self.gerar_pdf_btn)
         sidebar.addWidget(simulacao_btn)
         sidebar.addWidget(catalogar_btn)
         sidebar.addStretch()
@@ -283,6 +404,8 @@ class MainWindow(QMainWindow):
         central_pesar.setFixedSize(450, 120)
         central_pesar.setCursor(Qt.PointingHandCursor)
         central_pesar.setEnabled(False)
+        central_pesar.clicked.connect(self.weigh)
+        self.central_pesar = central_pesar
         self.add_shadow(central_pesar)
         pesar_status_container.addWidget(central_pesar)
 
@@ -329,15 +452,14 @@ class MainWindow(QMainWindow):
         graph_container = QFrame()
         graph_container.setStyleSheet("QFrame { background-color: #F2E8CF; border-radius: 20px; }")
         graph_container.setFixedSize(430, 320)
-        graph_layout = QVBoxLayout(graph_container)
-        graph_layout.setContentsMargins(10, 10, 10, 10)
-        
-        self.figure, self.ax = plt.subplots(figsize=(4.1, 2.9))
-        self.figure.set_facecolor('#F2E8CF')
-        self.canvas = FigureCanvas(self.figure)
-        self.canvas.setFixedSize(410, 300)
-        self.update_plot()
-        graph_layout.addWidget(self.canvas, alignment=Qt.AlignCenter)
+        self.graph_layout = QVBoxLayout(graph_container)
+        self.graph_layout.setContentsMargins(10, 10, 10, 10)
+        # Filled in by build_home_chart()
+        self.figure = None
+        self.plot_version = None
+        self.cow_lines = {}
+        self.cow_last_ts = {}
+        self.home_background = None
         
         graph_row.addWidget(graph_container)
         graph_section.addLayout(graph_row)
@@ -366,10 +488,15 @@ class MainWindow(QMainWindow):
 
         right_panel.addSpacing(20)
 
-        # Add vaccine buttons
+        # Add vaccine buttons, filled in by update_vaccines()
+        self.vaccine_buttons = []
         for _ in range(5):
-            vaccine_btn = self.create_vaccine_button("001 - 50 dias")
+            vaccine_btn = self.create_vaccine_button("")
+            vaccine_btn.entry = None
+            vaccine_btn.setVisible(False)
+            vaccine_btn.clicked.connect(lambda checked, btn=vaccine_btn: self.record_vaccine(btn))
             right_panel.addWidget(vaccine_btn)
+            self.vaccine_buttons.append(vaccine_btn)
         
         right_panel.addStretch()
 
@@ -385,21 +512,92 @@ class MainWindow(QMainWindow):
         main_layout.addWidget(central_widget)
         main_layout.addWidget(right_widget)
 
+    def build_home_chart(self):
+        startup.setup_matplotlib()
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+        # A plain Figure, not pyplot's: it is freed with its canvas
+        self.figure = Figure(figsize=(4.1, 2.9))
+        self.ax = self.figure.add_subplot()
+        self.figure.set_facecolor('#F2E8CF')
+        self.canvas = FigureCanvas(self.figure)
+        self.canvas.setFixedSize(410, 300)
+        self.canvas.mpl_connect('draw_event', self.on_home_draw)
+        self.graph_layout.addWidget(self.canvas, alignment=Qt.AlignCenter)
+        self.update_plot()
+
+    def on_home_draw(self, event):
+        # Live points are blitted over the last full draw
+        self.home_background = self.canvas.copy_from_bbox(self.ax.bbox)
+
+    def on_weighing(self, cow_id, weight_kg, timestamp):
+        # Extends that cow's line in place. While the point fits the current
+        # axes only the line is redrawn and blitted; otherwise the axes are
+        # rescaled with one coalesced full draw.
+        if self.figure is None:
+            return
+        last_ts = self.cow_last_ts.get(cow_id)
+        if last_ts is not None and timestamp < last_ts:
+            # Already drawn (queued before the chart was built) or out of
+            # order; the next full redraw puts it in place
+            return
+        self.cow_last_ts[cow_id] = timestamp
+        line = self.cow_lines.get(cow_id)
+        if line is None:
+            line, = self.ax.plot([1], [weight_kg], marker='o', color='#A7C957', linewidth=2, label=f"Cow {cow_id}")
+            self.cow_lines[cow_id] = line
+            fits = False
+        else:
+            x, y = line.get_xdata(), line.get_ydata()
+            if timestamp == last_ts:
+                # Re-weighed at the same timestamp: the reading replaces the last point
+                y = np.append(y[:-1], weight_kg)
+            else:
+                x, y = np.append(x, len(x) + 1), np.append(y, weight_kg)
+            line.set_data(x, y)
+            x0, x1 = self.ax.get_xlim()
+            y0, y1 = self.ax.get_ylim()
+            fits = x0 <= len(x) <= x1 and y0 <= weight_kg <= y1
+        if not fits or self.home_background is None:
+            self.ax.relim()
+            self.ax.autoscale_view()
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self.home_background)
+        self.ax.draw_artist(line)
+        self.canvas.blit(self.ax.bbox)
+        self.home_background = self.canvas.copy_from_bbox(self.ax.bbox)
+
     def update_plot(self):
+        # Redrawn only when the herd data has changed since the last draw
+        if self.figure is None:
+            return
+        from matplotlib.ticker import MaxNLocator
+        repository = get_repository()
+        if repository.version == self.plot_version:
+            return
+        self.plot_version = repository.version
         self.ax.clear()
+        self.cow_lines = {}
+        self.cow_last_ts = {}
+        self.home_background = None
         try:
-            df = pd.read_excel("data/weights.xlsx")
-            df.columns = df.columns.astype(str)
+            df = repository.frame()
+            timestamps = np.array(df.columns[1:], dtype=object)
 
             for index, row in df.iterrows():
                 # Get only the weight values (excluding the ID)
-                weights = row.iloc[1:].values
+                weights = row.iloc[1:].values.astype(float)
                 # Remove NaN values if any
-                weights = weights[~pd.isna(weights)]
+                present = ~np.isnan(weights)
+                weights = weights[present]
                 if len(weights) > 0:
+                    # Live updates only extend a line past its last drawn timestamp
+                    self.cow_last_ts[str(row.iloc[0])] = timestamps[present][-1]
                     # Create x values starting from 1 regardless of when measurements started
                     x = range(1, len(weights) + 1)
-                    self.ax.plot(x, weights, marker='o', color='#A7C957', linewidth=2, label=f"Cow {row.iloc[0]}")
+                    line, = self.ax.plot(x, weights, marker='o', color='#A7C957', linewidth=2, label=f"Cow {row.iloc[0]}")
+                    self.cow_lines[str(row.iloc[0])] = line
 
             self.ax.set_facecolor('#F2E8CF')
             
@@ -408,7 +606,7 @@ class MainWindow(QMainWindow):
             self.ax.set_axisbelow(True)  # Put grid behind the plot lines
             
             # Set integer ticks on x-axis
-            self.ax.xaxis.set_major_locator(plt.MaxNLocator(integer=True))
+            self.ax.xaxis.set_major_locator(MaxNLocator(integer=True))
             
             # Remove all labels as they're handled by QLabels
             self.ax.set_xlabel("")
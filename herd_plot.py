@@ -0,0 +1,47 @@
+import numpy as np
+
+# Series longer than this many points are decimated before drawing
+MAX_POINTS = 400
+BAND_PERCENTILES = (10, 50, 90)
+
+
+def decimate(y, buckets=MAX_POINTS // 2):
+    # Min/max per bucket: keeps every spike visible while cutting a long series
+    # to 2 * buckets points. Returns (x, y) with x as 1-based weighing numbers.
+    y = np.asarray(y, dtype=np.float64)
+    x = np.arange(1, len(y) + 1, dtype=np.float64)
+    if len(y) <= 2 * buckets:
+        return x, y
+    edges = np.linspace(0, len(y), buckets + 1).astype(np.intp)
+    chunks = np.split(y, edges[1:-1])
+    lo = edges[:-1] + np.array([np.argmin(chunk) for chunk in chunks])
+    hi = edges[:-1] + np.array([np.argmax(chunk) for chunk in chunks])
+    # Each bucket's min and max, in the order they occur
+    index = np.column_stack([np.minimum(lo, hi), np.maximum(lo, hi)]).ravel()
+    return x[index], y[index]
+
+
+def herd_segments(aligned, max_points=MAX_POINTS):
+    # One (n, 2) polyline per cow from the left-aligned weight matrix, where
+    # column k holds each cow's k-th weighing and NaN pads the shorter series
+    counts = np.count_nonzero(~np.isnan(aligned), axis=1)
+    segments = []
+    for row, count in zip(aligned, counts.tolist()):
+        if count == 0:
+            continue
+        x, y = decimate(row[:count], max_points // 2)
+        segments.append(np.column_stack([x, y]))
+    return segments
+
+
+def percentile_band(aligned, percentiles=BAND_PERCENTILES):
+    # (x, [p_low, p_mid, p_high]) across the herd at each weighing number,
+    # skipping positions only one cow has reached
+    if not aligned.size:
+        return np.empty(0), [np.empty(0) for _ in percentiles]
+    reached = np.count_nonzero(~np.isnan(aligned), axis=0)
+    columns = np.flatnonzero(reached >= 2)
+    if not len(columns):
+        return np.empty(0), [np.empty(0) for _ in percentiles]
+    bands = np.nanpercentile(aligned[:, columns], percentiles, axis=0)
+    return columns + 1.0, list(bands)
@@ -0,0 +1,93 @@
+import numpy as np
+from weight_store import get_store
+import data_manager
+
+
+class HerdRepository:
+    # Loads the herd once and hands the same arrays/DataFrame to every tab.
+    # The cache is dropped when this process logs a weighing or when the
+    # storage's mtime shows another process wrote to it.
+    def __init__(self):
+        self.store = get_store()
+        self.version = 0
+        self._generation = self.store.generation
+        self._journal_mtime = self._mtime()
+        self._dirty = False
+        self._matrix = None
+        self._aligned = None
+        self._frame = None
+        data_manager.add_listener(self._on_weight_logged)
+
+    def _mtime(self):
+        return self.store.journal.mtime()
+
+    def _on_weight_logged(self, cow_id, weight_kg, timestamp):
+        self._dirty = True
+
+    def refresh(self):
+        mtime = self._mtime()
+        if self._dirty or mtime != self._journal_mtime:
+            self._dirty = False
+            self._journal_mtime = mtime
+            self.store.refresh()
+        # The store is shared: another caller of get_store() may already have
+        # folded in the new weighings, so compare against the store's own state
+        if self.store.generation != self._generation:
+            self._generation = self.store.generation
+            self._matrix = None
+            self._aligned = None
+            self._frame = None
+            self.version += 1
+        return self
+
+    def cow_ids(self):
+        self.refresh()
+        return list(self.store.cow_ids)
+
+    def matrix(self):
+        # (cow_ids, timestamps, weights) with one row per cow, one column per
+        # timestamp and NaN where the cow was not weighed
+        self.refresh()
+        if self._matrix is None:
+            store = self.store
+            # The store already holds the parsed session axis and each weighing's column
+            weights = np.full((len(store.cow_ids), len(store.axis)), np.nan)
+            weights[store.cow, store.column] = store.weight
+            self._matrix = (list(store.cow_ids), store.axis, weights)
+        return self._matrix
+
+    def aligned(self):
+        # (cow_ids, weights) with column k holding each cow's k-th weighing,
+        # NaN past the end of shorter histories; rows as in matrix()
+        self.refresh()
+        if self._aligned is None:
+            store = self.store
+            position = np.arange(len(store.cow)) - np.searchsorted(store.cow, store.cow)
+            width = int(position.max()) + 1 if len(position) else 0
+            weights = np.full((len(store.cow_ids), width), np.nan)
+            weights[store.cow, position] = store.weight
+            self._aligned = (list(store.cow_ids), weights)
+        return self._aligned
+
+    def frame(self):
+        # Same layout as pd.read_excel("data/weights.xlsx")
+        self.refresh()
+        if self._frame is None:
+            # Only the chart screens need pandas; keep it off the startup path
+            import pandas as pd
+            cow_ids, timestamps, weights = self.matrix()
+            headers = [ts.replace('T', ' ') for ts in np.datetime_as_string(timestamps, unit='s').tolist()]
+            frame = pd.DataFrame(weights, columns=headers)
+            frame.insert(0, 'cow_id', cow_ids)
+            self._frame = frame
+        return self._frame
+
+
+_repository = None
+
+
+def get_repository():
+    global _repository
+    if _repository is None:
+        _repository = HerdRepository()
+    return _repository.refresh()
@@ -0,0 +1,60 @@
+import numpy as np
+
+PROJECTION_DAYS = 90
+SECONDS_PER_DAY = 86400
+
+
+def compute_cow_stats(cow, seconds, weights, n_cows):
+    # Per-cow statistics for the whole herd in one vectorized pass over the
+    # long-format columns of WeightStore: cow codes sorted ascending, and
+    # within each cow the timestamps (whole seconds) oldest first.
+    # Cows without weighings get count 0 and NaN elsewhere. The sums of
+    # weight, time (in days) and their products are the ones CowAggregate
+    # keeps as running totals.
+    cow = np.asarray(cow, dtype=np.intp)
+    seconds = np.asarray(seconds, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.float64)
+
+    starts = np.searchsorted(cow, np.arange(n_cows + 1))
+    count = np.diff(starts)
+    has_weights = count > 0
+    first = np.where(has_weights, starts[:-1], 0)
+    last = np.where(has_weights, starts[1:] - 1, 0)
+
+    def pick(values, rows, empty):
+        if not len(values):
+            return np.full(n_cows, empty, dtype=values.dtype)
+        return np.where(has_weights, values[rows], empty)
+
+    first_weight = pick(weights, first, np.nan)
+    last_weight = pick(weights, last, np.nan)
+    first_ts = pick(seconds, first, 0)
+    last_ts = pick(seconds, last, 0)
+
+    t = seconds / SECONDS_PER_DAY
+    sums = {name: np.bincount(cow, weights=values, minlength=n_cows)
+            for name, values in (('sum_w', weights), ('sum_ww', weights * weights),
+                                 ('sum_t', t), ('sum_tt', t * t), ('sum_tw', t * weights))}
+
+    mean_weight = np.full(n_cows, np.nan)
+    mean_weight[has_weights] = sums['sum_w'][has_weights] / count[has_weights]
+
+    # Whole days between first and last weighing, as timedelta.days does
+    days = (last_ts - first_ts) // SECONDS_PER_DAY
+    has_gmd = (count >= 2) & (days > 0)
+    gmd = np.full(n_cows, np.nan)
+    gmd[has_gmd] = (last_weight[has_gmd] - first_weight[has_gmd]) / days[has_gmd]
+
+    stats = {
+        'count': count,
+        'first_weight': first_weight,
+        'last_weight': last_weight,
+        'mean_weight': mean_weight,
+        'first_ts': first_ts,
+        'last_ts': last_ts,
+        'days': days,
+        'gmd': gmd,
+        'projection': last_weight + gmd * PROJECTION_DAYS,
+    }
+    stats.update(sums)
+    return stats
@@ -0,0 +1,188 @@
+import queue
+import threading
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from bluetooth_manager import BluetoothManager
+from data_manager import WeighingSession, now_timestamp, add_listener, open_journal
+from weight_filter import WeightStabilizer
+
+# The writer fsyncs once BATCH_SIZE weighings have been written since the
+# last fsync or the oldest of them has waited BATCH_WAIT seconds
+BATCH_SIZE = 64
+BATCH_WAIT = 0.5
+
+# How often (ms) WeighingEvents checks the journal for weighings written by other processes
+POLL_INTERVAL = 1000
+
+
+class IngestWriter(threading.Thread):
+    # The only thread that writes weighings: lanes queue them and it writes
+    # them, in arrival order, through a WeighingSession: whatever is queued
+    # goes out in one journal append right away, fsyncs are grouped, and
+    # failed writes are retried
+    def __init__(self, batch_size=BATCH_SIZE, batch_wait=BATCH_WAIT, on_error=None):
+        super().__init__(daemon=True)
+        self.queue = queue.Queue()
+        self.session = WeighingSession(batch_size, batch_wait, export_on_close=False,
+                                       on_error=on_error)
+
+    def submit(self, cow_id, weight_kg, scale_id=None, timestamp=None):
+        # Timestamped when the weight is taken, not when the batch is written
+        self.queue.put((cow_id, weight_kg, scale_id, timestamp or now_timestamp()))
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            stopping = False
+            while True:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                self.session.log_many(batch)
+            except Exception as e:
+                self.session.report_error(e)
+            if stopping:
+                break
+        try:
+            self.session.close()
+        except Exception as e:
+            self.session.report_error(e)
+
+    def close(self):
+        # Flushes whatever is queued, then stops
+        self.queue.put(None)
+        self.join()
+
+
+class WeighingEvents(QObject):
+    # New weighings as a Qt signal, read from the journal tail so each one is
+    # emitted exactly once, whichever process wrote it. Writes in this process
+    # trigger a read through data_manager's listeners (on the writing thread,
+    # often the ingest writer); other processes' are found by polling the
+    # journal's mtime. Widgets connected to `weighed` get it queued onto the
+    # GUI thread. Create it on the GUI thread.
+    weighed = pyqtSignal(str, float, str)  # cow_id, weight_kg, timestamp
+
+    def __init__(self, poll_interval=POLL_INTERVAL):
+        super().__init__()
+        self.journal = open_journal()
+        self._lock = threading.Lock()
+        self.offset = self.journal.end_offset()
+        self.mtime = self.journal.mtime()
+        add_listener(self.on_weighing)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.poll)
+        self.timer.start(poll_interval)
+
+    def on_weighing(self, cow_id, weight_kg, timestamp):
+        self.check()
+
+    def poll(self):
+        # One stat per tick; the file is only read when it has changed
+        mtime = self.journal.mtime()
+        if mtime != self.mtime:
+            self.mtime = mtime
+            self.check()
+
+    def check(self):
+        # Emits every weighing appended since the last check, in journal order
+        with self._lock:
+            records, self.offset = self.journal.read_from(self.offset)
+            for timestamp, cow_id, weight_kg in records:
+                self.weighed.emit(str(cow_id), float(weight_kg), str(timestamp))
+
+
+_events = None
+
+
+def get_weighing_events():
+    global _events
+    if _events is None:
+        _events = WeighingEvents()
+    return _events
+
+
+class IngestService(QObject):
+    # Several chutes weighing at once: one BLE loop holds a connection per
+    # scale, each lane weighs the cow assigned to it and every weighing goes
+    # through the same ordered writer
+    recorded = pyqtSignal(str, str, float)  # scale_id, cow_id, weight_kg (queued for writing)
+    stable_weight = pyqtSignal(str, float)  # scale_id, settled weight_kg
+    lane_status = pyqtSignal(str, bool)
+    error_message = pyqtSignal(str)
+    # A queued group could not be written; the writer keeps it and retries
+    write_error = pyqtSignal(str)
+
+    def __init__(self, scales, batch_size=BATCH_SIZE, batch_wait=BATCH_WAIT,
+                 auto_record=True, make_stabilizer=WeightStabilizer):
+        # scales maps scale_id -> transport (None for a real BLE scale found by name).
+        # With auto_record each lane logs its cow as soon as the weight settles.
+        super().__init__()
+        self.auto_record = auto_record
+        self.stabilizers = {scale_id: make_stabilizer() for scale_id in scales}
+        self.manager = BluetoothManager(scales=scales)
+        # Emitted from the writer or its retry timer, delivered on the GUI thread
+        self.writer = IngestWriter(batch_size, batch_wait, on_error=self.write_error.emit)
+        self.cows = {}
+        self.last_readings = {}
+        # Settled weights still waiting for their cow id, by lane
+        self.unclaimed = {}
+        self.manager.reading_received.connect(self.on_reading)
+        self.manager.lane_status.connect(self.lane_status)
+        self.manager.error_message.connect(self.error_message)
+
+    def start(self):
+        self.writer.start()
+        self.manager.start()
+
+    def stop(self):
+        self.manager.stop()
+        self.writer.close()
+
+    def set_cow(self, scale_id, cow_id):
+        # The animal now standing on this lane's scale. If it has already
+        # settled, its weight is logged right away.
+        self.cows[scale_id] = cow_id
+        settled = self.unclaimed.pop(scale_id, None)
+        if settled is not None and self.record(scale_id, settled):
+            self.cows.pop(scale_id, None)
+
+    def on_reading(self, scale_id, weight_kg):
+        self.last_readings[scale_id] = weight_kg
+        stabilizer = self.stabilizers[scale_id]
+        settled = stabilizer.feed(weight_kg)
+        if settled is None:
+            if not stabilizer.locked:
+                # The platform emptied before anyone claimed the weight
+                self.unclaimed.pop(scale_id, None)
+            return
+        self.last_readings[scale_id] = settled
+        # Logged before stable_weight goes out: a slot that reacts by assigning
+        # the next animal must not have this weight logged against it
+        if self.auto_record:
+            if self.record(scale_id):
+                # One weighing per animal: the next one needs a new cow id
+                self.cows.pop(scale_id, None)
+            else:
+                self.unclaimed[scale_id] = settled
+        self.stable_weight.emit(scale_id, settled)
+
+    def record(self, scale_id, weight_kg=None):
+        # Queues the lane's latest reading (the settled weight once there is
+        # one), or weight_kg, for its current cow
+        cow_id = self.cows.get(scale_id)
+        if weight_kg is None:
+            weight_kg = self.last_readings.get(scale_id)
+        if cow_id is None or weight_kg is None:
+            return False
+        self.writer.submit(cow_id, weight_kg, scale_id)
+        self.recorded.emit(scale_id, str(cow_id), weight_kg)
+        return True
@@ -0,0 +1,82 @@
+import threading
+import traceback
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobSignals(QObject):
+    progress = pyqtSignal(int, int)  # done, total
+    finished = pyqtSignal(object)    # return value of the job function
+    error = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+
+class Job(QRunnable):
+    # Runs fn(*args, progress=callback, **kwargs) on a pool thread. The job
+    # function reports progress through the callback, which is also where a
+    # cancelled job stops: the callback raises JobCancelled.
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = JobSignals()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def report_progress(self, done, total):
+        if self._cancelled.is_set():
+            raise JobCancelled()
+        self.signals.progress.emit(done, total)
+
+    def run(self):
+        try:
+            if self._cancelled.is_set():
+                raise JobCancelled()
+            result = self.fn(*self.args, progress=self.report_progress, **self.kwargs)
+        except JobCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            print(traceback.format_exc())
+            self.signals.error.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
+
+
+class JobRunner:
+    def __init__(self, pool=None):
+        self.pool = pool if pool is not None else QThreadPool.globalInstance()
+        self.jobs = set()
+
+    def submit(self, fn, *args, on_progress=None, on_done=None, **kwargs):
+        # on_progress(done, total) and on_done(*result) are connected before
+        # the job starts, so a job that finishes at once is not missed.
+        # on_done runs whether the job finished, failed or was cancelled.
+        job = Job(fn, *args, **kwargs)
+        # Keep the job alive until it reports back
+        self.jobs.add(job)
+        done = lambda *_: self.jobs.discard(job)
+        for signal in (job.signals.finished, job.signals.error, job.signals.cancelled):
+            signal.connect(done)
+            if on_done is not None:
+                signal.connect(on_done)
+        if on_progress is not None:
+            job.signals.progress.connect(on_progress)
+        self.pool.start(job)
+        return job
+
+    def cancel_all(self):
+        for job in list(self.jobs):
+            job.cancel()
+
+    def wait(self, msecs=-1):
+        return self.pool.waitForDone(msecs)
@@ -0,0 +1,141 @@
+import re
+import asyncio
+from bleak import BleakScanner, BleakClient
+from bleak.exc import BleakError
+
+# The scale streams its display as ASCII lines ("  452.5 kg\r\n") over a
+# serial-over-BLE bridge. These defaults match the Nordic UART service;
+# change them if the indicator firmware uses a different profile.
+WEIGHT_CHARACTERISTIC_UUID = '6e400003-b5a3-f393-e0a9-e50e24dcca9e'
+SCALE_NAME_PREFIXES = ('Tru-Test', 'TruTest', 'XR5000', 'ID5000', 'S3')
+SCAN_TIMEOUT = 10.0
+
+# Seconds to wait before looking for a scale again after it was lost
+RECONNECT_DELAY = 2
+
+WEIGHT_PATTERN = re.compile(rb'[-+]?\d+(?:[.,]\d+)?')
+
+
+class WeightDecoder:
+    # Reassembles notification chunks into lines and parses one weight per line
+    def __init__(self):
+        self._buffer = b''
+
+    def feed(self, data):
+        self._buffer += bytes(data)
+        weights = []
+        while True:
+            match = re.search(rb'[\r\n]', self._buffer)
+            if match is None:
+                break
+            line, self._buffer = self._buffer[:match.start()], self._buffer[match.end():]
+            number = WEIGHT_PATTERN.search(line)
+            if number is not None:
+                weights.append(float(number.group().replace(b',', b'.')))
+        return weights
+
+
+def is_scale(device, advertisement=None):
+    name = device.name or (advertisement.local_name if advertisement is not None else None) or ''
+    return name.startswith(SCALE_NAME_PREFIXES)
+
+
+class BleakTransport:
+    # Real hardware: find the scale, connect once and subscribe to its weight stream.
+    # With several scales in range, give each transport its scale's address.
+    def __init__(self, address=None, characteristic=WEIGHT_CHARACTERISTIC_UUID, scan_timeout=SCAN_TIMEOUT):
+        self.address = address
+        self.characteristic = characteristic
+        self.scan_timeout = scan_timeout
+        self._client = None
+
+    async def find(self):
+        if self.address is not None:
+            return await BleakScanner.find_device_by_address(self.address, timeout=self.scan_timeout)
+        return await BleakScanner.find_device_by_filter(is_scale, timeout=self.scan_timeout)
+
+    async def connect(self, device, on_data, on_disconnect):
+        self._client = BleakClient(device, disconnected_callback=lambda client: on_disconnect())
+        await self._client.connect()
+        await self._client.start_notify(self.characteristic, lambda sender, data: on_data(data))
+
+    async def disconnect(self):
+        client, self._client = self._client, None
+        if client is not None and client.is_connected:
+            await client.disconnect()
+
+
+class FakeScaleTransport:
+    # Stands in for the scale in tests and demos: "connects" immediately and
+    # streams the given readings as the indicator would, one line each.
+    def __init__(self, readings, interval=0.05, chunk_size=None, name='Tru-Test Fake'):
+        self.readings = list(readings)
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.name = name
+        self._task = None
+        self._streamed = False
+
+    async def find(self):
+        # The fake scale goes away once it has sent all its readings
+        return None if self._streamed else self.name
+
+    async def connect(self, device, on_data, on_disconnect):
+        self._streamed = True
+        self._task = asyncio.ensure_future(self._stream(on_data, on_disconnect))
+
+    async def _stream(self, on_data, on_disconnect):
+        for reading in self.readings:
+            await asyncio.sleep(self.interval)
+            line = f"{reading:8.1f} kg\r\n".encode('ascii')
+            size = self.chunk_size or len(line)
+            for start in range(0, len(line), size):
+                on_data(line[start:start + size])
+        on_disconnect()
+
+    async def disconnect(self):
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+
+
+class ScaleLane:
+    # One scale: finds it, stays subscribed and reconnects if the link drops.
+    # Callbacks run on the event loop thread.
+    def __init__(self, scale_id, transport, on_reading, on_status, on_error):
+        self.scale_id = scale_id
+        self.transport = transport
+        self.on_reading = on_reading
+        self.on_status = on_status
+        self.on_error = on_error
+        self.decoder = WeightDecoder()
+
+    def on_data(self, data):
+        # Called on every notification; each complete line is one reading
+        for weight in self.decoder.feed(data):
+            self.on_reading(self.scale_id, weight)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            disconnected = asyncio.Event()
+            connected = False
+            try:
+                device = await self.transport.find()
+                if device is None:
+                    await asyncio.sleep(RECONNECT_DELAY)
+                    continue
+                self.decoder = WeightDecoder()
+                await self.transport.connect(
+                    device, self.on_data,
+                    lambda: loop.call_soon_threadsafe(disconnected.set))
+                connected = True
+                self.on_status(self.scale_id, True)
+                await disconnected.wait()
+            except (BleakError, OSError) as e:
+                self.on_error(self.scale_id, e)
+                await asyncio.sleep(RECONNECT_DELAY)
+            finally:
+                if connected:
+                    self.on_status(self.scale_id, False)
+                await self.transport.disconnect()
@@ -1,8 +1,10 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
                            QLabel, QLineEdit, QFrame, QComboBox)
 from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QFont, QFontDatabase
-import pandas as pd
+from PyQt5.QtGui import QFont
+import startup
+from herd_repository import get_repository
+from weight_aggregates import get_aggregates
 from datetime import datetime, timedelta
 
 class SimulationTab(QWidget):
@@ -11,14 +13,25 @@ class SimulationTab(QWidget):
         self.main_window = main_window
         self.setStyleSheet("background-color: #6A994E;")
         
-        # Load Montserrat Black and Bold fonts
-        QFontDatabase.addApplicationFont("fonts/Montserrat-Black.ttf")
-        QFontDatabase.addApplicationFont("fonts/Montserrat-Bold.ttf")
+        # Load Montserrat Black and Bold fonts (no-op after the first screen)
+        startup.register_qt_fonts()
         
         self.initUI()
 
     def go_back(self):
-        self.main_window.initUI()
+        self.main_window.show_home()
+
+    def refresh(self):
+        # Called every time the screen is shown; keeps the inputs, reloads the herd
+        if get_repository().version != self.cow_ids_version:
+            selected = self.gado_combo.currentText()
+            self.gado_combo.blockSignals(True)
+            self.gado_combo.clear()
+            self.load_cow_ids()
+            index = self.gado_combo.findText(selected)
+            self.gado_combo.setCurrentIndex(max(index, 0))
+            self.gado_combo.blockSignals(False)
+        self.update_current_weight()
 
     def initUI(self):
         # Main layout
@@ -235,11 +248,11 @@ class SimulationTab(QWidget):
 
     def load_cow_ids(self):
         try:
-            df = pd.read_excel("data/weights.xlsx")
+            repository = get_repository()
+            self.cow_ids_version = repository.version
             # Add default option first
             self.gado_combo.addItem("Escolha um gado")
-            cow_ids = df.iloc[:, 0].unique()  # Get unique cow IDs from first column
-            for cow_id in cow_ids:
+            for cow_id in repository.cow_ids():
                 self.gado_combo.addItem(str(cow_id))
             # Trigger the currentIndexChanged signal to update the current weight
             self.gado_combo.setCurrentIndex(0)
@@ -248,39 +261,18 @@ class SimulationTab(QWidget):
 
     def get_current_weight(self, cow_id):
         try:
-            df = pd.read_excel("data/weights.xlsx")
             # Convert cow_id to string for comparison
             cow_id = str(cow_id)
-            # Get the row for this cow
-            row = df[df['cow_id'].astype(str) == cow_id]
-            if not row.empty:
-                # Get all columns except 'cow_id'
-                weight_columns = [col for col in df.columns if col != 'cow_id']
-                # Get timestamps from column headers
-                timestamps = pd.to_datetime(weight_columns)
-                # Get all weights for this cow
-                weights = row[weight_columns].iloc[0]
-                weights = weights.dropna()
+            # Running totals kept up to date on every weighing
+            cow = get_aggregates().cow(cow_id)
+            if cow is not None and cow.count > 0:
+                last_weight = cow.last_weight
+                gmd = cow.gmd()
                 
-                if not weights.empty:
-                    last_weight = float(weights.iloc[-1])
-                    
-                    # Calculate GMD if we have at least 2 weights
-                    gmd = None
-                    if len(weights) >= 2:
-                        # Get timestamps for this cow's measurements
-                        weight_positions = weights.index.get_indexer(weights.index)
-                        valid_timestamps = timestamps[weight_positions]
-                        
-                        # Calculate GMD using all available data points
-                        days_diff = (valid_timestamps[-1] - valid_timestamps[0]).days
-                        if days_diff > 0:
-                            weight_diff = weights.iloc[-1] - weights.iloc[0]
-                            gmd = weight_diff / days_diff
-                    
-                    print(f"Found last weight for cow {cow_id}: {last_weight}, GMD: {gmd}")
-                    return last_weight, gmd
-                    
+                print(f"Found last weight for cow {cow_id}: {last_weight}, GMD: {gmd}")
+                return last_weight, gmd
+                
+
             print(f"No weights found for cow {cow_id}")
         except Exception as e:
             print(f"Error getting current weight: {e}")
@@ -0,0 +1,59 @@
+import time
+
+# Imported first by gui.py, so this is as close to process start as we get
+_started = time.perf_counter()
+
+# Cold-start budget: seconds from launch until the main window is on screen.
+# Measured on every start; anything over it is printed so regressions show up.
+STARTUP_BUDGET = 1.5
+
+FONT_PATHS = {
+    'Montserrat-Black': 'fonts/Montserrat-Black.ttf',
+    'Montserrat-Bold': 'fonts/Montserrat-Bold.ttf'
+}
+
+_qt_fonts = False
+_matplotlib_fonts = False
+
+
+def elapsed():
+    return time.perf_counter() - _started
+
+
+def register_qt_fonts():
+    # Once per process, whichever screen asks first
+    global _qt_fonts
+    if _qt_fonts:
+        return
+    _qt_fonts = True
+    from PyQt5.QtGui import QFontDatabase
+    for font_name, font_path in FONT_PATHS.items():
+        if QFontDatabase.addApplicationFont(font_path) < 0:
+            print(f"Error: Could not load {font_name} font for Qt")
+
+
+def setup_matplotlib():
+    # Called by the first screen that draws a chart, so matplotlib is not
+    # imported before the window is up. matplotlib keeps its own font list
+    # cached on disk; only our two files are added, once.
+    global _matplotlib_fonts
+    if _matplotlib_fonts:
+        return
+    _matplotlib_fonts = True
+    import matplotlib
+    import matplotlib.font_manager as fm
+    for font_name, font_path in FONT_PATHS.items():
+        try:
+            fm.fontManager.addfont(font_path)
+        except Exception as e:
+            print(f"Error registering {font_name} for matplotlib: {e}")
+    # Set Montserrat as the default font family for matplotlib
+    matplotlib.rcParams['font.family'] = 'Montserrat'
+
+
+def report_startup(budget=STARTUP_BUDGET):
+    seconds = elapsed()
+    print(f"Janela principal pronta em {seconds:.2f}s")
+    if seconds > budget:
+        print(f"⚠️ Inicialização acima do limite de {budget:.1f}s")
+    return seconds
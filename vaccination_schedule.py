@@ -0,0 +1,253 @@
+import os
+import heapq
+import threading
+from datetime import date, datetime
+from atomic_io import atomic_write
+
+SCHEDULE_PATH = 'data/store/vaccinations.log'
+
+# Protocol -> (days after the animal's first weighing, days between doses).
+# None between doses means a single dose.
+PROTOCOLS = {
+    'Aftosa': (30, 180),
+    'Raiva': (60, 365),
+    'Vermífugo': (0, 90),
+    'Brucelose': (90, None),
+}
+
+# Rewrite the log once it has this many times more lines than live entries
+COMPACT_RATIO = 4
+COMPACT_MIN_LINES = 1000
+
+# One change per line: "<cow_id>\t<protocol>\t<due YYYY-MM-DD | ->\n"; the
+# last line for a (cow, protocol) wins and "-" means nothing more is due
+SEPARATOR = '\t'
+DONE = '-'
+
+
+class DueQueue:
+    # Binary min-heap of (due, key) plus a key -> heap position index, so a
+    # due date can be set, moved or removed in O(log n) without searching
+    def __init__(self):
+        self.heap = []
+        self.position = {}
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, key):
+        return key in self.position
+
+    def due(self, key):
+        i = self.position.get(key)
+        return None if i is None else self.heap[i][0]
+
+    def set(self, key, due):
+        i = self.position.get(key)
+        if i is None:
+            self.heap.append((due, key))
+            self.position[key] = len(self.heap) - 1
+            self._up(len(self.heap) - 1)
+            return
+        old = self.heap[i][0]
+        self.heap[i] = (due, key)
+        if due < old:
+            self._up(i)
+        else:
+            self._down(i)
+
+    def remove(self, key):
+        i = self.position.pop(key, None)
+        if i is None:
+            return
+        last = self.heap.pop()
+        if i < len(self.heap):
+            self.heap[i] = last
+            self.position[last[1]] = i
+            self._up(i)
+            self._down(self.position[last[1]])
+
+    def ordered(self):
+        # Entries soonest first, generated lazily: taking the first k only
+        # visits the O(k) nodes near the top of the heap
+        frontier = [(self.heap[0], 0)] if self.heap else []
+        while frontier:
+            entry, i = heapq.heappop(frontier)
+            yield entry
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(self.heap):
+                    heapq.heappush(frontier, (self.heap[child], child))
+
+    def _swap(self, i, j):
+        heap = self.heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self.position[heap[i][1]] = i
+        self.position[heap[j][1]] = j
+
+    def _up(self, i):
+        while i > 0:
+            parent = (i - 1) // 2
+            if self.heap[i] >= self.heap[parent]:
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _down(self, i):
+        size = len(self.heap)
+        while True:
+            smallest = i
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < size and self.heap[child] < self.heap[smallest]:
+                    smallest = child
+            if smallest == i:
+                break
+            self._swap(i, smallest)
+            i = smallest
+
+
+class VaccinationSchedule:
+    # Next due date of every (cow, protocol), kept in a DueQueue and persisted
+    # as an append-only log next to the weight store. New animals are
+    # scheduled when first weighed; recording a dose moves its due date.
+    def __init__(self, path=SCHEDULE_PATH, protocols=PROTOCOLS):
+        self.path = path
+        self.protocols = protocols
+        self.queue = DueQueue()
+        self.cows = set()
+        self._lines = 0
+        self._lock = threading.RLock()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        if not self.exists():
+            return self
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                # A torn last line (crash mid-write) is ignored
+                if not line.endswith('\n'):
+                    break
+                self._lines += 1
+                parts = line.rstrip('\n').split(SEPARATOR)
+                if len(parts) != 3:
+                    continue
+                cow_id, protocol, due = parts
+                self.cows.add(cow_id)
+                if due == DONE:
+                    self.queue.remove((cow_id, protocol))
+                    continue
+                try:
+                    self.queue.set((cow_id, protocol), date.fromisoformat(due).toordinal())
+                except ValueError:
+                    continue
+        return self
+
+    def _write(self, entries):
+        # entries: (cow_id, protocol, due ordinal or None)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8', newline='\n') as f:
+            f.write(''.join(
+                f"{cow_id}{SEPARATOR}{protocol}{SEPARATOR}"
+                f"{DONE if due is None else date.fromordinal(due).isoformat()}\n"
+                for cow_id, protocol, due in entries))
+        self._lines += len(entries)
+        if self._lines > max(COMPACT_MIN_LINES, COMPACT_RATIO * len(self.queue)):
+            self.compact()
+
+    def compact(self):
+        # One line per live entry, plus a DONE line for animals with nothing
+        # due so they are not scheduled again
+        with self._lock:
+            scheduled = {cow_id for cow_id, _ in self.queue.position}
+            lines = [f"{cow_id}{SEPARATOR}{protocol}{SEPARATOR}{date.fromordinal(due).isoformat()}\n"
+                     for due, (cow_id, protocol) in self.queue.heap]
+            lines += [f"{cow_id}{SEPARATOR}{SEPARATOR}{DONE}\n"
+                      for cow_id in self.cows - scheduled]
+            with atomic_write(self.path, 'w', encoding='utf-8', newline='\n') as f:
+                f.write(''.join(lines))
+            self._lines = len(lines)
+
+    def add_animals(self, first_seen):
+        # first_seen: {cow_id: date of first weighing}; animals already known are skipped
+        with self._lock:
+            entries = []
+            for cow_id, seen in first_seen.items():
+                if cow_id in self.cows:
+                    continue
+                self.cows.add(cow_id)
+                for protocol, (first_after, _) in self.protocols.items():
+                    due = seen.toordinal() + first_after
+                    self.queue.set((cow_id, protocol), due)
+                    entries.append((cow_id, protocol, due))
+            if entries:
+                self._write(entries)
+
+    def record(self, cow_id, protocol, given=None):
+        # A dose was given: schedule the next one, or drop a single-dose protocol
+        given = given or date.today()
+        repeat = self.protocols[protocol][1]
+        due = None if repeat is None else given.toordinal() + repeat
+        with self._lock:
+            if due is None:
+                self.queue.remove((cow_id, protocol))
+            else:
+                self.queue.set((cow_id, protocol), due)
+            self._write([(cow_id, protocol, due)])
+
+    def upcoming_animals(self, n=5):
+        # [(cow_id, protocol, due date), ...], soonest first, each animal once
+        # with its most urgent protocol
+        with self._lock:
+            result = []
+            seen = set()
+            for due, (cow_id, protocol) in self.queue.ordered():
+                if len(result) == n:
+                    break
+                if cow_id not in seen:
+                    seen.add(cow_id)
+                    result.append((cow_id, protocol, date.fromordinal(due)))
+            return result
+
+    def due_for(self, cow_id):
+        # [(protocol, due date), ...] still due for one animal, soonest first
+        with self._lock:
+            dues = sorted((self.queue.due((cow_id, protocol)), protocol)
+                          for protocol in self.protocols if (cow_id, protocol) in self.queue)
+            return [(protocol, date.fromordinal(due)) for due, protocol in dues]
+
+    def on_weighing(self, cow_id, weight_kg, timestamp):
+        # O(1) for animals already scheduled
+        cow_id = str(cow_id)
+        if cow_id in self.cows:
+            return
+        try:
+            seen = datetime.strptime(str(timestamp)[:10], '%Y-%m-%d').date()
+        except ValueError:
+            seen = date.today()
+        self.add_animals({cow_id: seen})
+
+
+_schedule = None
+
+
+def get_schedule():
+    global _schedule
+    if _schedule is None:
+        from weight_aggregates import get_aggregates, to_datetime
+        schedule = VaccinationSchedule()
+        # On the first start the herd's history predates the schedule, so
+        # every animal is scheduled from today rather than shown overdue
+        # since its first weighing. Later, animals weighed while the
+        # schedule was not running (other processes) start from their first weighing.
+        first_start = not schedule.exists()
+        schedule.load()
+        aggregates = get_aggregates()
+        today = date.today()
+        schedule.add_animals({cow_id: today if first_start else to_datetime(cow.first_ts).date()
+                              for cow_id, cow in aggregates.cows.items()
+                              if cow_id not in schedule.cows and cow.count})
+        _schedule = schedule
+    return _schedule
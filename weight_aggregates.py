@@ -0,0 +1,230 @@
+import os
+import json
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+from weight_journal import get_journal, JOURNAL_PATH
+from weight_store import WeightStore, parse_timestamps
+from herd_stats import compute_cow_stats
+from atomic_io import atomic_write
+
+AGGREGATES_PATH = 'data/store/aggregates.json'
+# Snapshots in an older layout are rebuilt from the journal
+AGGREGATES_FORMAT = 3
+
+# Rewrite the snapshot once this many weighings have been folded in since the last one
+SAVE_AFTER = 1000
+SECONDS_PER_DAY = 86400
+PROJECTION_DAYS = 90
+
+
+# Timestamps are naive local times; they are counted as UTC seconds so that
+# day differences match plain datetime subtraction across DST changes.
+def to_datetime(seconds):
+    return datetime(1970, 1, 1) + timedelta(seconds=seconds)
+
+
+class CowAggregate:
+    # Running totals for one cow; t is in days so the regression slope is kg/day
+    __slots__ = ('first_ts', 'first_weight', 'last_ts', 'last_weight',
+                 'count', 'sum_w', 'sum_ww', 'sum_t', 'sum_tt', 'sum_tw')
+
+    def __init__(self, values=None):
+        if values is None:
+            values = [None, None, None, None, 0, 0.0, 0.0, 0.0, 0.0, 0.0]
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def to_list(self):
+        return [getattr(self, name) for name in self.__slots__]
+
+    def _add_sums(self, ts, weight_kg, sign):
+        t = ts / SECONDS_PER_DAY
+        self.count += sign
+        self.sum_w += sign * weight_kg
+        self.sum_ww += sign * weight_kg * weight_kg
+        self.sum_t += sign * t
+        self.sum_tt += sign * t * t
+        self.sum_tw += sign * t * weight_kg
+
+    def add(self, ts, weight_kg):
+        # Returns False, changing nothing, for a reading older than the cow's
+        # latest: it may replace an earlier reading the totals cannot see,
+        # so the caller recomputes the cow instead
+        if self.count and ts < self.last_ts:
+            return False
+        if self.count and ts == self.last_ts:
+            # Same cow, same second: the new reading replaces the old one
+            self._add_sums(ts, self.last_weight, -1)
+            if self.first_ts == ts:
+                self.first_weight = weight_kg
+            self.last_weight = weight_kg
+        else:
+            if self.count == 0:
+                self.first_ts, self.first_weight = ts, weight_kg
+            self.last_ts, self.last_weight = ts, weight_kg
+        self._add_sums(ts, weight_kg, 1)
+        return True
+
+    def mean(self):
+        return self.sum_w / self.count if self.count else None
+
+    def days(self):
+        if not self.count:
+            return 0
+        return (self.last_ts - self.first_ts) // SECONDS_PER_DAY
+
+    def gmd(self):
+        # (last - first) / whole days between them, as the tabs compute it
+        days = self.days()
+        if self.count < 2 or days <= 0:
+            return None
+        return (self.last_weight - self.first_weight) / days
+
+    def regression_gmd(self):
+        # Least-squares slope of weight over time, in kg/day
+        if self.count < 2:
+            return None
+        denominator = self.count * self.sum_tt - self.sum_t * self.sum_t
+        if denominator <= 0:
+            return None
+        return (self.count * self.sum_tw - self.sum_t * self.sum_w) / denominator
+
+    def projection(self, days=PROJECTION_DAYS):
+        gmd = self.gmd()
+        return None if gmd is None else self.last_weight + gmd * days
+
+
+class HerdAggregates:
+    def __init__(self, path=AGGREGATES_PATH, journal=None):
+        self.path = path
+        self.journal = journal if journal is not None else get_journal()
+        self.cows = {}
+        self.journal_offset = 0
+        self._unsaved = 0
+        # The ingest writer thread folds in new weighings while the GUI reads
+        self._lock = threading.RLock()
+        # Herd totals, kept in step with each cow's contribution
+        self.sum_last_weight = 0.0
+        self.cows_weighed = 0
+        self.sum_gmd = 0.0
+        self.cows_with_gmd = 0
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        else:
+            data = None
+        # A snapshot taken from another storage backend is rebuilt from scratch
+        if (data is not None and data.get('format') == AGGREGATES_FORMAT
+                and data.get('source', JOURNAL_PATH) == self.journal.path):
+            self.journal_offset = data['journal_offset']
+            for cow_id, values in data['cows'].items():
+                cow = CowAggregate(values)
+                self.cows[cow_id] = cow
+                self._count(cow, 1)
+        else:
+            records, self.journal_offset = self.journal.read_from(0)
+            self.rebuild(records)
+            self._unsaved += len(records)
+        self.refresh()
+        return self
+
+    def rebuild(self, records):
+        # Recomputes every cow in records from scratch: the records are sorted
+        # and deduplicated as WeightStore does and herd_stats computes all the
+        # totals in one vectorized pass, instead of folding weighings one by one
+        store = WeightStore(journal=self.journal)
+        store.extend(records)
+        stats = compute_cow_stats(store.cow, store.ts.astype(np.int64), store.weight, len(store.cow_ids))
+        with self._lock:
+            for code, cow_id in enumerate(store.cow_ids):
+                old = self.cows.get(cow_id)
+                if old is not None:
+                    self._count(old, -1)
+                cow = CowAggregate([stats[name][code].item() for name in CowAggregate.__slots__])
+                self.cows[cow_id] = cow
+                self._count(cow, 1)
+
+    def _count(self, cow, sign):
+        if cow.count:
+            self.sum_last_weight += sign * cow.last_weight
+            self.cows_weighed += sign
+        gmd = cow.gmd()
+        if gmd is not None:
+            self.sum_gmd += sign * gmd
+            self.cows_with_gmd += sign
+
+    def add_seconds(self, ts, cow_id, weight_kg):
+        # False when the cow has to be recomputed (see CowAggregate.add)
+        cow = self.cows.get(cow_id)
+        if cow is None:
+            cow = self.cows[cow_id] = CowAggregate()
+        self._count(cow, -1)
+        added = cow.add(ts, float(weight_kg))
+        self._count(cow, 1)
+        return added
+
+    def refresh(self):
+        # Folds in the weighings appended to the journal since the last read
+        with self._lock:
+            records, self.journal_offset = self.journal.read_from(self.journal_offset)
+            # Parsed once per distinct timestamp, not once per weighing
+            seconds = parse_timestamps([record[0] for record in records])
+            valid = ~np.isnat(seconds)
+            seconds = seconds.astype(np.int64).tolist()
+            stale = set()
+            for (_, cow_id, weight_kg), ts, ok in zip(records, seconds, valid.tolist()):
+                if ok and cow_id not in stale and not self.add_seconds(ts, cow_id, weight_kg):
+                    stale.add(cow_id)
+            if stale:
+                # Out-of-order readings (a re-logged older session, a re-import)
+                # are rare: recompute those cows from their records up to here
+                history, _ = self.journal.read_from(0, end=self.journal_offset)
+                self.rebuild([record for record in history if record[1] in stale])
+            self._unsaved += len(records)
+            if self._unsaved >= SAVE_AFTER:
+                self.save()
+            return len(records)
+
+    def save(self):
+        with self._lock:
+            with atomic_write(self.path, 'w', encoding='utf-8') as f:
+                json.dump({'journal_offset': self.journal_offset,
+                           'format': AGGREGATES_FORMAT,
+                           'source': self.journal.path,
+                           'cows': {cow_id: cow.to_list() for cow_id, cow in self.cows.items()}}, f)
+            self._unsaved = 0
+
+    def cow(self, cow_id):
+        return self.cows.get(str(cow_id))
+
+    def peso_medio(self):
+        # Mean of every cow's latest weight
+        return self.sum_last_weight / self.cows_weighed if self.cows_weighed else None
+
+    def gmd(self):
+        return self.sum_gmd / self.cows_with_gmd if self.cows_with_gmd else None
+
+    def projection(self, days=PROJECTION_DAYS):
+        peso_medio, gmd = self.peso_medio(), self.gmd()
+        if peso_medio is None or gmd is None:
+            return None
+        return gmd * days + peso_medio
+
+
+_aggregates = None
+
+
+def get_aggregates():
+    global _aggregates
+    if _aggregates is None:
+        import data_manager
+        data_manager.open_journal()
+        _aggregates = HerdAggregates().load()
+        # Each weighing logged in this process is folded in as soon as it is written
+        data_manager.add_listener(lambda cow_id, weight_kg, timestamp: _aggregates.refresh())
+    else:
+        _aggregates.refresh()
+    return _aggregates
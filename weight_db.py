@@ -0,0 +1,151 @@
+import os
+import sqlite3
+import threading
+
+DB_PATH = 'data/weights.db'
+# Largest seq SQLite can hand out; read_from's default upper bound
+LAST_SEQ = 2 ** 63 - 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS animals (
+    id INTEGER PRIMARY KEY,
+    cow_id TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS weighings (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    animal_id INTEGER NOT NULL REFERENCES animals(id),
+    ts TEXT NOT NULL,
+    weight_kg REAL NOT NULL,
+    scale_id TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS weighings_animal_ts ON weighings(animal_id, ts);
+CREATE INDEX IF NOT EXISTS weighings_ts ON weighings(ts);
+"""
+
+
+class SqliteWeightLog:
+    # SQLite storage behind the same interface as WeightJournal, so the store,
+    # aggregates, index and workbook export run unchanged on top of it. The
+    # read offset is the `seq` of the last weighing read: re-weighing a cow at
+    # the same timestamp replaces the row and gives it a new seq, so readers
+    # see it as a new record and keep the latest, as with the journal.
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.RLock()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Shared by the GUI and the ingest writer thread, guarded by _lock
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=FULL')
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def mtime(self):
+        # In WAL mode new commits land in the -wal file first
+        times = [os.stat(p).st_mtime_ns for p in (self.path, self.path + '-wal') if os.path.exists(p)]
+        return max(times) if times else None
+
+    def append(self, timestamp, cow_id, weight_kg, scale_id=None):
+        self.append_many([(timestamp, cow_id, weight_kg, scale_id)])
+
+    def append_many(self, records):
+        # records: (timestamp, cow_id, weight_kg, scale_id) tuples, one transaction
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany('INSERT OR IGNORE INTO animals (cow_id) VALUES (?)',
+                                 [(str(record[1]),) for record in records])
+                conn.executemany(
+                    'INSERT OR REPLACE INTO weighings (animal_id, ts, weight_kg, scale_id) '
+                    'SELECT id, ?, ?, ? FROM animals WHERE cow_id = ?',
+                    [(str(timestamp), float(weight_kg), scale_id, str(cow_id))
+                     for timestamp, cow_id, weight_kg, scale_id in records])
+
+    def sync(self):
+        # Every append is already a committed transaction
+        pass
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            if self._conn is None and not self.exists():
+                return []
+            return self._connect().execute(sql, params).fetchall()
+
+    def records(self):
+        records, _ = self.read_from(0)
+        return iter(records)
+
+    def end_offset(self):
+        # seq of the last weighing written
+        rows = self._query('SELECT MAX(seq) FROM weighings')
+        return (rows[0][0] or 0) if rows else 0
+
+    def read_from(self, offset=0, end=None):
+        # Returns the weighings written after seq `offset` (up to seq `end`,
+        # if given) and the last seq read
+        rows = self._query(
+            'SELECT w.seq, w.ts, a.cow_id, w.weight_kg FROM weighings w '
+            'JOIN animals a ON a.id = w.animal_id WHERE w.seq > ? AND w.seq <= ? ORDER BY w.seq',
+            (offset, LAST_SEQ if end is None else end))
+        if not rows:
+            return [], offset
+        return [(ts, cow_id, weight_kg) for _, ts, cow_id, weight_kg in rows], rows[-1][0]
+
+    # Indexed lookups for callers that want one answer, not the whole herd
+
+    def cow_ids(self):
+        return [row[0] for row in self._query('SELECT cow_id FROM animals ORDER BY id')]
+
+    def timestamps(self):
+        return [row[0] for row in self._query('SELECT DISTINCT ts FROM weighings ORDER BY ts')]
+
+    def series(self, cow_id):
+        # [(timestamp, weight_kg), ...] for one cow, oldest first
+        return self._query(
+            'SELECT w.ts, w.weight_kg FROM weighings w JOIN animals a ON a.id = w.animal_id '
+            'WHERE a.cow_id = ? ORDER BY w.ts', (str(cow_id),))
+
+    def weight_at(self, cow_id, timestamp):
+        rows = self._query(
+            'SELECT w.weight_kg FROM weighings w JOIN animals a ON a.id = w.animal_id '
+            'WHERE a.cow_id = ? AND w.ts = ?', (str(cow_id), str(timestamp)))
+        return rows[0][0] if rows else None
+
+
+def main():
+    # Copies the existing journal (or legacy workbook) into the database;
+    # set STORAGE_BACKEND = 'sqlite' in weight_journal.py to use it afterwards
+    from weight_journal import WeightJournal
+    from data_manager import FILE_PATH, import_excel
+    db = SqliteWeightLog()
+    if db.exists() and db.cow_ids():
+        print(f"⚠️ {DB_PATH} já existe.")
+        return
+    journal = WeightJournal()
+    if journal.exists():
+        db.append_many([(ts, cow_id, weight_kg, None) for ts, cow_id, weight_kg in journal.records()])
+    elif os.path.exists(FILE_PATH):
+        import_excel(db)
+    count = len(db.read_from(0)[0])
+    db.close()
+    print(f"✅ {count} pesagens copiadas para {DB_PATH}")
+
+
+if __name__ == "__main__":
+    main()
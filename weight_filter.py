@@ -0,0 +1,79 @@
+from collections import deque
+
+# Readings needed in the window before a weight can settle
+WINDOW_SIZE = 10
+# Largest spread (standard deviation, kg) the window may have to count as settled
+MAX_STD_KG = 0.5
+# Below this the platform is considered empty and the next animal can settle
+EMPTY_BELOW_KG = 20.0
+# Smoothing factor of the EMA settle mode (0-1, higher follows the scale faster)
+EMA_ALPHA = 0.3
+MEDIAN = 'median'
+EMA = 'ema'
+
+
+class WeightStabilizer:
+    # Turns the raw stream of one scale into one settled weight per animal.
+    # feed() keeps a rolling window with running sums, so each reading costs
+    # O(1); once the window's variance drops under the threshold it returns
+    # the window median (or the EMA) and stays locked until the platform
+    # empties again.
+    def __init__(self, window_size=WINDOW_SIZE, max_std=MAX_STD_KG,
+                 empty_below=EMPTY_BELOW_KG, mode=MEDIAN, ema_alpha=EMA_ALPHA):
+        if mode not in (MEDIAN, EMA):
+            raise ValueError(f"Unknown settle mode: {mode}")
+        self.window_size = max(2, int(window_size))
+        self.max_variance = max_std * max_std
+        self.empty_below = empty_below
+        self.mode = mode
+        self.ema_alpha = ema_alpha
+        self.reset()
+
+    def reset(self):
+        self.window = deque()
+        self.sum_w = 0.0
+        self.sum_ww = 0.0
+        self.ema = None
+        self.locked = False
+
+    def variance(self):
+        n = len(self.window)
+        if n < 2:
+            return None
+        mean = self.sum_w / n
+        # Clamp the rounding error of the running sums
+        return max(self.sum_ww / n - mean * mean, 0.0)
+
+    def feed(self, weight_kg):
+        # Returns the settled weight the first time the animal holds still,
+        # None for every other reading
+        if weight_kg < self.empty_below:
+            if self.window or self.locked:
+                self.reset()
+            return None
+        if self.locked:
+            return None
+        self.window.append(weight_kg)
+        self.sum_w += weight_kg
+        self.sum_ww += weight_kg * weight_kg
+        if len(self.window) > self.window_size:
+            old = self.window.popleft()
+            self.sum_w -= old
+            self.sum_ww -= old * old
+        if self.ema is None:
+            self.ema = weight_kg
+        else:
+            self.ema += self.ema_alpha * (weight_kg - self.ema)
+        if len(self.window) < self.window_size or self.variance() > self.max_variance:
+            return None
+        self.locked = True
+        return round(self.settled(), 1)
+
+    def settled(self):
+        if self.mode == EMA:
+            return self.ema
+        values = sorted(self.window)
+        middle = len(values) // 2
+        if len(values) % 2:
+            return values[middle]
+        return (values[middle - 1] + values[middle]) / 2
@@ -0,0 +1,122 @@
+import os
+from atomic_io import atomic_write
+
+INDEX_PATH = 'data/weights.index'
+
+# Append-only log of workbook coordinates: a cow gets the next free row and a
+# timestamp the next free column the first time they are written.
+#   "c\t<cow_id>\n"     -> row 2, 3, ...
+#   "t\t<timestamp>\n"  -> column 2, 3, ...
+COW = 'c'
+TIMESTAMP = 't'
+FIRST_ROW = 2
+FIRST_COLUMN = 2
+
+
+def format_entries(entries):
+    return ''.join(f"{kind}\t{key}\n" for kind, key in entries).encode('utf-8')
+
+
+class WeightIndex:
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self.rows = {}
+        self.columns = {}
+        self._offset = 0
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def refresh(self):
+        # Picks up entries appended by other processes since the last read
+        if not self.exists() or os.path.getsize(self.path) <= self._offset:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                self._offset += len(line)
+                kind, _, key = line.decode('utf-8').rstrip('\n').partition('\t')
+                self._remember(kind, key)
+
+    def _remember(self, kind, key):
+        if kind == COW and key not in self.rows:
+            self.rows[key] = FIRST_ROW + len(self.rows)
+        elif kind == TIMESTAMP and key not in self.columns:
+            self.columns[key] = FIRST_COLUMN + len(self.columns)
+
+    def _write(self, entries):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'ab') as f:
+            f.write(format_entries(entries))
+        for kind, key in entries:
+            self._remember(kind, key)
+        self._offset = os.path.getsize(self.path)
+
+    def add(self, cow_id, timestamp):
+        # Returns (row, column) for a weighing, registering new keys as needed
+        return self.add_many([(cow_id, timestamp)])[0]
+
+    def add_many(self, pairs):
+        # Like add() for a batch of (cow_id, timestamp), with one write for all new keys
+        pairs = [(str(cow_id), str(timestamp)) for cow_id, timestamp in pairs]
+        self.refresh()
+        entries = []
+        new_cows = set()
+        new_timestamps = set()
+        for cow_id, timestamp in pairs:
+            if cow_id not in self.rows and cow_id not in new_cows:
+                new_cows.add(cow_id)
+                entries.append((COW, cow_id))
+            if timestamp not in self.columns and timestamp not in new_timestamps:
+                new_timestamps.add(timestamp)
+                entries.append((TIMESTAMP, timestamp))
+        if entries:
+            self._write(entries)
+        return [(self.rows[cow_id], self.columns[timestamp]) for cow_id, timestamp in pairs]
+
+    def rebuild(self, records, cow_ids=(), timestamps=()):
+        # Recreates the index from (timestamp, cow_id, weight) records. cow_ids and
+        # timestamps seed rows and columns in that order (the legacy workbook's
+        # layout, including cows without weighings); keys only found in the
+        # records follow, cows by first appearance and timestamps in date order.
+        self.rows = {}
+        self.columns = {}
+        cows = dict.fromkeys(str(cow_id) for cow_id in cow_ids)
+        seeded = dict.fromkeys(str(timestamp) for timestamp in timestamps)
+        extra = set()
+        for timestamp, cow_id, _ in records:
+            cows.setdefault(str(cow_id))
+            if str(timestamp) not in seeded:
+                extra.add(str(timestamp))
+        entries = [(COW, cow_id) for cow_id in cows]
+        entries.extend((TIMESTAMP, timestamp) for timestamp in list(seeded) + sorted(extra))
+        # Swapped in whole: a crash leaves the old index or the new one, never a partial one
+        data = format_entries(entries)
+        with atomic_write(self.path) as f:
+            f.write(data)
+        for kind, key in entries:
+            self._remember(kind, key)
+        self._offset = len(data)
+
+    def row(self, cow_id):
+        self.refresh()
+        return self.rows.get(str(cow_id))
+
+    def column(self, timestamp):
+        self.refresh()
+        return self.columns.get(str(timestamp))
+
+
+_index = None
+
+
+def get_index():
+    global _index
+    if _index is None:
+        _index = WeightIndex()
+    _index.refresh()
+    return _index
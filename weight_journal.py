@@ -0,0 +1,150 @@
+import os
+import time
+import atexit
+import threading
+
+JOURNAL_PATH = 'data/weights.journal'
+
+# Where weighings are kept: 'journal' (this append-only file) or 'sqlite'
+# (weight_db.SqliteWeightLog). Both offer the same interface; run
+# `python weight_db.py` once to copy the journal into the database.
+STORAGE_BACKEND = 'journal'
+
+# Records are flushed to the OS on every append, but fsync is batched:
+# the journal is synced after FSYNC_EVERY records or FSYNC_INTERVAL seconds,
+# whichever comes first, and always on close.
+FSYNC_EVERY = 32
+FSYNC_INTERVAL = 1.0
+
+# One weighing per line: "<timestamp>\t<cow_id>\t<weight_kg>[\t<scale_id>]\n"
+SEPARATOR = '\t'
+
+
+def clean_field(value):
+    return str(value).replace(SEPARATOR, ' ').replace('\n', ' ')
+
+
+def format_record(timestamp, cow_id, weight_kg, scale_id=None):
+    line = f"{timestamp}{SEPARATOR}{clean_field(cow_id)}{SEPARATOR}{float(weight_kg)!r}"
+    if scale_id is not None:
+        line += f"{SEPARATOR}{clean_field(scale_id)}"
+    return line + "\n"
+
+
+def parse_record(line):
+    # Returns (timestamp, cow_id, weight_kg); the optional scale tag is not needed by readers
+    parts = line.rstrip('\n').split(SEPARATOR)
+    if len(parts) not in (3, 4):
+        return None
+    timestamp, cow_id, weight = parts[:3]
+    try:
+        return timestamp, cow_id, float(weight)
+    except ValueError:
+        return None
+
+
+class WeightJournal:
+    def __init__(self, path=JOURNAL_PATH, fsync_every=FSYNC_EVERY, fsync_interval=FSYNC_INTERVAL):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._file = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.RLock()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def mtime(self):
+        return os.stat(self.path).st_mtime_ns if self.exists() else None
+
+    def _open(self):
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8', newline='\n')
+        return self._file
+
+    def append(self, timestamp, cow_id, weight_kg, scale_id=None):
+        self.append_many([(timestamp, cow_id, weight_kg, scale_id)])
+
+    def append_many(self, records):
+        # records: (timestamp, cow_id, weight_kg, scale_id) tuples, written in one go
+        with self._lock:
+            f = self._open()
+            f.write(''.join(format_record(*record) for record in records))
+            f.flush()
+            self._pending += len(records)
+            if (self._pending >= self.fsync_every
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self.sync()
+
+    def sync(self):
+        with self._lock:
+            if self._file is not None and self._pending:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            self._pending = 0
+            self._last_sync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self.sync()
+                self._file.close()
+                self._file = None
+
+    def records(self):
+        records, _ = self.read_from(0)
+        return iter(records)
+
+    def end_offset(self):
+        # Offset just past the last complete record, without reading the whole file
+        if not self.exists():
+            return 0
+        size = os.path.getsize(self.path)
+        with open(self.path, 'rb') as f:
+            start = max(0, size - 4096)
+            f.seek(start)
+            tail = f.read()
+        cut = tail.rfind(b'\n')
+        if cut < 0:
+            return self.read_from(0)[1]
+        return start + cut + 1
+
+    def read_from(self, offset=0, end=None):
+        # Returns the complete records written after byte `offset` (and before
+        # byte `end`, if given) and the offset just past them
+        records = []
+        if not self.exists() or os.path.getsize(self.path) <= offset:
+            return records, offset
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if end is not None and offset >= end:
+                    break
+                # A torn last line (crash mid-write) is left for the next read
+                if not line.endswith(b'\n'):
+                    break
+                offset += len(line)
+                record = parse_record(line.decode('utf-8'))
+                if record is not None:
+                    records.append(record)
+        return records, offset
+
+
+_journal = None
+
+
+def get_journal():
+    global _journal
+    if _journal is None:
+        if STORAGE_BACKEND == 'sqlite':
+            from weight_db import SqliteWeightLog
+            _journal = SqliteWeightLog()
+        else:
+            _journal = WeightJournal()
+        atexit.register(_journal.close)
+    return _journal
@@ -1,36 +1,41 @@
-from openpyxl import load_workbook
+import numpy as np
+from data_manager import sync_excel, open_index, open_journal
+from weight_index import FIRST_ROW, FIRST_COLUMN
+from workbook_reader import load_sheet
+import weight_journal
 
 FILE_PATH = 'data/weights.xlsx'
 
 def load_headers_and_ids():
-    wb = load_workbook(FILE_PATH)
-    ws = wb.active
+    if weight_journal.STORAGE_BACKEND == 'sqlite':
+        # Indexed queries; the workbook is not needed at all
+        db = open_journal()
+        return db.timestamps(), db.cow_ids(), None
+    sync_excel()
+    index = open_index()
+    # The whole sheet as a (cow x timestamp) array, laid out as the index says
+    _, _, weights = load_sheet(FILE_PATH)
 
-    headers = [ws.cell(row=1, column=col).value for col in range(2, ws.max_column + 1)]  # skip cow_id
-    cow_ids = [ws.cell(row=row, column=1).value for row in range(2, ws.max_row + 1)]
-    return headers, cow_ids, ws
+    headers = list(index.columns)  # ordered by column
+    cow_ids = list(index.rows)  # ordered by row
+    return headers, cow_ids, weights
 
-def find_weight(ws, cow_id, timestamp):
-    # Find row for cow_id
-    cow_row = None
-    for row in range(2, ws.max_row + 1):
-        if str(ws.cell(row=row, column=1).value) == str(cow_id):
-            cow_row = row
-            break
-
-    if cow_row is None:
+def find_weight(weights, cow_id, timestamp):
+    if weights is None:
+        return open_journal().weight_at(cow_id, timestamp)
+    index = open_index()
+    cow_row = index.row(cow_id)
+    timestamp_col = index.column(timestamp)
+    if cow_row is None or timestamp_col is None:
         return None
-
-    # Find column for timestamp
-    for col in range(2, ws.max_column + 1):
-        if str(ws.cell(row=1, column=col).value) == str(timestamp):
-            return ws.cell(row=cow_row, column=col).value
-
-    return None
+    row, col = cow_row - FIRST_ROW, timestamp_col - FIRST_COLUMN
+    if row >= weights.shape[0] or col >= weights.shape[1] or np.isnan(weights[row, col]):
+        return None
+    return float(weights[row, col])
 
 def main():
     try:
-        headers, cow_ids, ws = load_headers_and_ids()
+        headers, cow_ids, weights = load_headers_and_ids()
     except FileNotFoundError:
         print("Arquivo de dados não encontrado.")
         return
@@ -61,7 +66,7 @@ def main():
         print("Escolha inválida.")
         return
 
-    weight = find_weight(ws, cow_id, timestamp)
+    weight = find_weight(weights, cow_id, timestamp)
     if weight is None:
         print(f"Sem pesagem registrada para o animal {cow_id} na data {timestamp}")
     else:
@@ -0,0 +1,217 @@
+import os
+import json
+import shutil
+import numpy as np
+from datetime import datetime
+from weight_journal import get_journal, JOURNAL_PATH
+from atomic_io import atomic_write, fsync_directory
+
+STORE_DIR = 'data/store'
+# Each save writes a new snapshot directory and then switches meta.json to it,
+# so a reader never mixes columns from two saves
+SNAPSHOT_PREFIX = 'snapshot-'
+COLUMNS = ('cow_ids', 'cow', 'ts', 'weight')
+
+# Rewrite the snapshot once this many weighings have piled up in the journal tail
+COMPACT_AFTER = 1000
+
+
+def parse_timestamps(values):
+    # Journal timestamps are 'YYYY-MM-DD HH:MM:SS'; anything unparseable becomes NaT.
+    # A session stamps the whole herd with the same string, so each distinct
+    # string is parsed once and the result is spread back to every record.
+    if not len(values):
+        return np.empty(0, dtype='datetime64[s]')
+    distinct, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    try:
+        parsed = distinct.astype('datetime64[s]')
+    except ValueError:
+        parsed = np.empty(len(distinct), dtype='datetime64[s]')
+        for i, value in enumerate(distinct):
+            try:
+                parsed[i] = np.datetime64(value, 's')
+            except ValueError:
+                parsed[i] = np.datetime64('NaT')
+    return parsed[inverse]
+
+
+class WeightStore:
+    # Long-format weight history: one (cow, timestamp, weight) row per weighing,
+    # kept as typed columns sorted by cow and then by timestamp.
+    def __init__(self, path=STORE_DIR, journal=None):
+        self.path = path
+        self.journal = journal if journal is not None else get_journal()
+        self.cow_ids = []
+        self.cow_codes = {}
+        self.cow = np.empty(0, dtype=np.int32)
+        self.ts = np.empty(0, dtype='datetime64[s]')
+        self.weight = np.empty(0, dtype=np.float64)
+        self.journal_offset = 0
+        # Bumped whenever the columns change, whoever triggered the reload
+        self.generation = 0
+        self._pending = []
+        self._normalize()
+
+    def load(self):
+        meta_path = os.path.join(self.path, 'meta.json')
+        for attempt in range(3):
+            if not os.path.exists(meta_path):
+                break
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('source', JOURNAL_PATH) != self.journal.path:
+                # Offsets of another storage backend mean nothing here; rebuild
+                break
+            # Stores written before snapshots keep their columns in the top directory
+            directory = os.path.join(self.path, meta.get('snapshot', ''))
+            try:
+                columns = {name: np.load(os.path.join(directory, f'{name}.npy')) for name in COLUMNS}
+            except FileNotFoundError:
+                # Pruned by a newer save between reading meta.json and the columns
+                continue
+            self.cow_ids = [str(c) for c in columns['cow_ids']]
+            self.cow_codes = {cow_id: code for code, cow_id in enumerate(self.cow_ids)}
+            self.cow, self.ts, self.weight = columns['cow'], columns['ts'], columns['weight']
+            self.journal_offset = meta['journal_offset']
+            self._normalize()
+            break
+        if self.refresh() >= COMPACT_AFTER:
+            self.save()
+        return self
+
+    def refresh(self):
+        # Fold in whatever was appended to the journal since we last read it
+        records, self.journal_offset = self.journal.read_from(self.journal_offset)
+        self.extend(records)
+        return len(records)
+
+    def extend(self, records):
+        # Folds in (timestamp, cow_id, weight_kg) records with one sort for the batch
+        if records:
+            self._pending.extend(records)
+            self._normalize()
+
+    def _normalize(self):
+        if self._pending:
+            codes = np.empty(len(self._pending), dtype=np.int32)
+            for i, (_, cow_id, _) in enumerate(self._pending):
+                code = self.cow_codes.get(cow_id)
+                if code is None:
+                    code = len(self.cow_ids)
+                    self.cow_codes[cow_id] = code
+                    self.cow_ids.append(cow_id)
+                codes[i] = code
+            ts = parse_timestamps([record[0] for record in self._pending])
+            weight = np.array([record[2] for record in self._pending], dtype=np.float64)
+            self._pending = []
+
+            valid = ~np.isnat(ts)
+            cow = np.concatenate([self.cow, codes[valid]])
+            ts = np.concatenate([self.ts, ts[valid]])
+            weight = np.concatenate([self.weight, weight[valid]])
+
+            # Stable sort keeps write order among equal keys, so the latest
+            # weighing of a cow at a given timestamp wins, as in the workbook.
+            order = np.lexsort((ts, cow))
+            cow, ts, weight = cow[order], ts[order], weight[order]
+            keep = np.ones(len(cow), dtype=bool)
+            keep[:-1] = (cow[1:] != cow[:-1]) | (ts[1:] != ts[:-1])
+            self.cow, self.ts, self.weight = cow[keep], ts[keep], weight[keep]
+
+        self._cow_starts = np.searchsorted(self.cow, np.arange(len(self.cow_ids) + 1))
+        by_ts = np.argsort(self.ts, kind='stable')
+        # The session axis: every distinct timestamp once, in order, and for
+        # each weighing its column on that axis
+        sorted_ts = self.ts[by_ts]
+        starts = np.ones(len(sorted_ts), dtype=bool)
+        starts[1:] = sorted_ts[1:] != sorted_ts[:-1]
+        self.axis = sorted_ts[starts]
+        self.column = np.empty(len(sorted_ts), dtype=np.intp)
+        self.column[by_ts] = np.cumsum(starts) - 1
+        self._axis_datetimes = None
+        self.generation += 1
+
+    def save(self):
+        self.refresh()
+        snapshot = f'{SNAPSHOT_PREFIX}{self.journal_offset}-{os.getpid()}'
+        directory = os.path.join(self.path, snapshot)
+        os.makedirs(directory, exist_ok=True)
+        columns = {'cow_ids': np.array(self.cow_ids, dtype=str),
+                   'cow': self.cow, 'ts': self.ts, 'weight': self.weight}
+        for name in COLUMNS:
+            with open(os.path.join(directory, f'{name}.npy'), 'wb') as f:
+                np.save(f, columns[name])
+                f.flush()
+                os.fsync(f.fileno())
+        fsync_directory(directory)
+        meta_path = os.path.join(self.path, 'meta.json')
+        previous = None
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                previous = json.load(f).get('snapshot')
+        with atomic_write(meta_path, 'w', encoding='utf-8') as f:
+            json.dump({'journal_offset': self.journal_offset, 'snapshot': snapshot,
+                       'source': self.journal.path}, f)
+        self.prune_snapshots(keep={snapshot, previous})
+
+    def prune_snapshots(self, keep):
+        # The previous snapshot is kept for readers that are still loading it
+        for name in os.listdir(self.path):
+            if name.startswith(SNAPSHOT_PREFIX) and name not in keep:
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+    def __len__(self):
+        return len(self.weight)
+
+    def axis_datetimes(self):
+        # The session axis as datetime objects, converted once per reload
+        if self._axis_datetimes is None:
+            self._axis_datetimes = self.axis.astype(datetime)
+        return self._axis_datetimes
+
+    def series(self):
+        # {cow_id: [(datetime, weight), ...]} for every cow with at least one weighing
+        data = {}
+        dates = self.axis_datetimes()[self.column].tolist()
+        weights = self.weight.tolist()
+        for code, cow_id in enumerate(self.cow_ids):
+            start, stop = int(self._cow_starts[code]), int(self._cow_starts[code + 1])
+            if start == stop:
+                continue
+            data[cow_id] = list(zip(dates[start:stop], weights[start:stop]))
+        return data
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        from data_manager import open_journal
+        open_journal()
+        _store = WeightStore().load()
+    else:
+        _store.refresh()
+    return _store
+
+
+def migrate():
+    # Imports the legacy wide workbook into the journal (first run only)
+    # and writes the columnar snapshot next to it.
+    from data_manager import open_journal
+    open_journal()
+    store = WeightStore().load()
+    store.save()
+    from weight_aggregates import get_aggregates
+    get_aggregates().save()
+    return store
+
+
+def main():
+    store = migrate()
+    print(f"✅ {len(store)} pesagens de {len(store.cow_ids)} animais migradas para {STORE_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import numpy as np
+
+
+def to_weights(values):
+    # Object array of cell values -> float64, NaN for blanks and non-numbers
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        weights = np.full(values.shape, np.nan)
+        for position, value in np.ndenumerate(values):
+            try:
+                weights[position] = float(value)
+            except (TypeError, ValueError):
+                pass
+        return weights
+
+
+def load_sheet(path):
+    # Reads the wide workbook (cow_id column, one column per timestamp) in a
+    # single streaming pass. Returns (cow_ids, timestamps, weights) with one
+    # weights row per cow_ids entry, one column per timestamp and NaN gaps.
+    # Rows without a cow id are dropped; columns keep their workbook order.
+    # openpyxl is only needed for legacy workbooks, not on every start
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        timestamps = [None if ts is None else str(ts) for ts in header[1:]]
+        width = len(timestamps)
+        cow_ids = []
+        cells = []
+        for row in rows:
+            if not row or row[0] is None:
+                continue
+            cow_ids.append(str(row[0]))
+            values = list(row[1:width + 1])
+            values.extend([None] * (width - len(values)))
+            cells.append(values)
+    finally:
+        wb.close()
+
+    values = np.array(cells, dtype=object).reshape(len(cells), width)
+    values[np.equal(values, None)] = np.nan
+    return cow_ids, timestamps, to_weights(values)
+
+
+def sheet_records(cow_ids, timestamps, weights):
+    # (timestamp, cow_id, weight_kg) for every filled cell, cow by cow
+    rows, columns = np.nonzero(~np.isnan(weights))
+    return [(timestamps[col], cow_ids[row], float(weights[row, col]))
+            for row, col in zip(rows.tolist(), columns.tolist())
+            if timestamps[col] is not None]